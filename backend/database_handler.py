@@ -1,9 +1,19 @@
 # backend/database_handler.py (Final, Complete, and Corrected)
+from dotenv import load_dotenv
+# RECOGNITION_MODEL below tags and filters embeddings, so .env must be loaded before it is read
+load_dotenv()
 import sqlite3
 import pickle
 import json
 import os
+import tempfile
+from contextlib import contextmanager
+import numpy as np
 from datetime import date, datetime
+try:
+    import fcntl
+except ImportError:  # Windows: exports are still safe from torn files, just not serialized
+    fcntl = None
 
 # Import auth module ONLY to use its hashing function from the parent directory
 from . import auth 
@@ -11,6 +21,35 @@ from . import auth
 DB_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
 DB_FILE = os.path.join(DB_FOLDER, "project_netra_final.db")
 os.makedirs(DB_FOLDER, exist_ok=True)
+
+# Embeddings are stored as raw little-endian float32 bytes, with their length in
+# `embedding_dim` and the model that produced them in `embedding_model`.
+EMBEDDING_DTYPE = np.dtype('<f4')
+DEFAULT_EMBEDDING_MODEL = os.getenv("RECOGNITION_MODEL", "ArcFace")
+
+# Memory-mappable gallery snapshot shared by every worker process (see export_gallery_snapshot)
+SNAPSHOT_FOLDER = os.path.join(DB_FOLDER, "gallery_snapshot")
+SNAPSHOT_POINTER = os.path.join(SNAPSHOT_FOLDER, "current.json")
+SNAPSHOT_LOCK = os.path.join(SNAPSHOT_FOLDER, "export.lock")
+
+# Callbacks notified as callback(event, roll_no) whenever the students table changes.
+# Events: "upsert", "update", "delete" (with a roll_no) and "reset" (roll_no is None).
+_students_listeners = []
+
+def add_students_listener(callback):
+    if callback not in _students_listeners:
+        _students_listeners.append(callback)
+
+def remove_students_listener(callback):
+    if callback in _students_listeners:
+        _students_listeners.remove(callback)
+
+def _notify_students_changed(event, roll_no=None):
+    for callback in list(_students_listeners):
+        try:
+            callback(event, roll_no)
+        except Exception as e:
+            print(f"Students listener failed on '{event}' for {roll_no}: {e}")
 #hhdfd
 def _get_department_id_by_code(cursor, dept_code):
     if not dept_code:
@@ -70,6 +109,8 @@ def initialize_database():
             parent_phone_number TEXT,
             department_id INTEGER,
             arcface_embedding BLOB NOT NULL,
+            embedding_dim INTEGER,
+            embedding_model TEXT,
             FOREIGN KEY(department_id) REFERENCES departments(id) ON DELETE SET NULL
         )''')
     # Timetable table
@@ -93,11 +134,80 @@ def initialize_database():
         cursor.execute("ALTER TABLE users ADD COLUMN assigned_class TEXT")
     except sqlite3.OperationalError:
         pass # Column already exists, do nothing
+    _migrate_student_embeddings(cursor)
+    _create_students_version_triggers(cursor)
     conn.commit()
     conn.close()
     
     print("Database initialized successfully.")
 
+def _migrate_student_embeddings(cursor):
+    """Converts legacy pickled embeddings (rows with no embedding_dim) to the raw float32 format."""
+    for column in ("embedding_dim INTEGER", "embedding_model TEXT"):
+        try:
+            cursor.execute(f"ALTER TABLE students ADD COLUMN {column}")
+        except sqlite3.OperationalError:
+            pass # Column already exists, do nothing
+    cursor.execute("SELECT roll_no, arcface_embedding FROM students WHERE embedding_dim IS NULL")
+    legacy_rows = cursor.fetchall()
+    for roll_no, blob in legacy_rows:
+        try:
+            # Trusted legacy rows written by this app; this is the only place pickle is still read
+            blob, dim = serialize_embedding(pickle.loads(blob))
+        except Exception as e:
+            print(f"Could not migrate embedding for student {roll_no}: {e}")
+            continue
+        cursor.execute(
+            "UPDATE students SET arcface_embedding = ?, embedding_dim = ?, embedding_model = ? WHERE roll_no = ?",
+            (blob, dim, DEFAULT_EMBEDDING_MODEL, roll_no)
+        )
+    if legacy_rows:
+        print(f"Migrated {len(legacy_rows)} pickled student embeddings to float32 storage.")
+
+def _create_students_version_triggers(cursor):
+    """Keeps a students-table change counter in app_meta, bumped by every insert, update and delete."""
+    cursor.execute("CREATE TABLE IF NOT EXISTS app_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    cursor.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('students_version', 0)")
+    for operation in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS students_version_{operation.lower()} AFTER {operation} ON students
+            BEGIN
+                UPDATE app_meta SET value = value + 1 WHERE key = 'students_version';
+            END''')
+
+def serialize_embedding(embedding):
+    """Returns (raw little-endian float32 bytes, dimension) for storing an embedding."""
+    vector = np.asarray(embedding, dtype=EMBEDDING_DTYPE).ravel()
+    return vector.tobytes(), int(vector.size)
+
+def deserialize_embedding(blob, dim):
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE, count=dim).astype(np.float32)
+
+def _is_current_model(embedding_model):
+    # Rows without a recorded model predate the column and were all produced by the default model
+    return embedding_model is None or embedding_model == DEFAULT_EMBEDDING_MODEL
+
+def _embeddings_to_matrix(rows, blob_index, dim_index, model_index):
+    """
+    Copies the embedding BLOBs of many rows into one preallocated float32 matrix.
+    Returns (matrix, row indices that were loaded); rows produced by another recognition
+    model, or whose dimension disagrees with the first row, are skipped.
+    """
+    usable = [i for i, row in enumerate(rows) if row[dim_index] and _is_current_model(row[model_index])]
+    other_model = sum(1 for row in rows if row[dim_index] and not _is_current_model(row[model_index]))
+    if other_model:
+        print(f"Skipping {other_model} student embeddings that were not produced by {DEFAULT_EMBEDDING_MODEL}.")
+    if not usable:
+        return np.empty((0, 0), dtype=np.float32), []
+    dim = rows[usable[0]][dim_index]
+    loaded = [i for i in usable if rows[i][dim_index] == dim]
+    if len(loaded) != len(usable):
+        print(f"Skipping {len(usable) - len(loaded)} student embeddings that are not {dim}-dimensional.")
+    matrix = np.empty((len(loaded), dim), dtype=np.float32)
+    for out_row, i in enumerate(loaded):
+        matrix[out_row] = np.frombuffer(rows[i][blob_index], dtype=EMBEDDING_DTYPE, count=dim)
+    return matrix, loaded
+
 def get_user_by_username(username: str):
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
@@ -140,32 +250,201 @@ def recreate_students_table():
     conn.commit()
     conn.close()
     initialize_database()
+    # Dropping the table bypasses the triggers, so bump the change counter by hand
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'students_version'")
+    conn.commit()
+    conn.close()
+    _notify_students_changed("reset")
 
-def add_student(roll_no, name, student_class, embedding, parent_phone_number=None, department=None):
+def add_student(roll_no, name, student_class, embedding, parent_phone_number=None, department=None, embedding_model=None):
     """Adds a student. Translates department code to ID before inserting."""
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     # --- CHANGE: Look up department ID from the code ---
     department_id = _get_department_id_by_code(cursor, department)
-    serialized_embedding = pickle.dumps(embedding)
+    serialized_embedding, embedding_dim = serialize_embedding(embedding)
     cursor.execute(
-        "REPLACE INTO students (roll_no, name, student_class, parent_phone_number, department_id, arcface_embedding) VALUES (?, ?, ?, ?, ?, ?)",
-        (roll_no, name, student_class, parent_phone_number, department_id, serialized_embedding)
+        "REPLACE INTO students (roll_no, name, student_class, parent_phone_number, department_id, arcface_embedding, embedding_dim, embedding_model) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (roll_no, name, student_class, parent_phone_number, department_id, serialized_embedding,
+         embedding_dim, embedding_model or DEFAULT_EMBEDDING_MODEL)
     )
     conn.commit()
     conn.close()
+    _notify_students_changed("upsert", roll_no)
 
 def get_all_student_data():
     try:
         conn = sqlite3.connect(DB_FILE)
         cursor = conn.cursor()
-        cursor.execute("SELECT roll_no, name, arcface_embedding FROM students")
+        cursor.execute("SELECT roll_no, name, arcface_embedding, embedding_dim, embedding_model FROM students")
+        rows = cursor.fetchall()
+        conn.close()
+        matrix, loaded = _embeddings_to_matrix(rows, 2, 3, 4)
+        return {rows[i][0]: {"name": rows[i][1], "arcface_embedding": matrix[j]} for j, i in enumerate(loaded)}
+    except sqlite3.OperationalError:
+        return {}
+
+def get_all_student_records():
+    """Returns {roll_no: {"name", "student_class", "arcface_embedding"}} for every student."""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.cursor()
+        cursor.execute("SELECT roll_no, name, student_class, arcface_embedding, embedding_dim, embedding_model FROM students")
         rows = cursor.fetchall()
         conn.close()
-        return {row[0]: {"name": row[1], "arcface_embedding": pickle.loads(row[2])} for row in rows}
+        matrix, loaded = _embeddings_to_matrix(rows, 3, 4, 5)
+        return {
+            rows[i][0]: {"name": rows[i][1], "student_class": rows[i][2], "arcface_embedding": matrix[j]}
+            for j, i in enumerate(loaded)
+        }
     except sqlite3.OperationalError:
         return {}
 
+def get_student_record(roll_no: str):
+    """Returns {"name", "student_class", "arcface_embedding"} for one student, or None."""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, student_class, arcface_embedding, embedding_dim, embedding_model FROM students WHERE roll_no = ?", (roll_no,))
+        row = cursor.fetchone()
+        conn.close()
+        if not row or not row[3]:
+            return None
+        if not _is_current_model(row[4]):
+            print(f"Skipping embedding of student {roll_no}: produced by {row[4]}, not {DEFAULT_EMBEDDING_MODEL}.")
+            return None
+        return {"name": row[0], "student_class": row[1], "arcface_embedding": deserialize_embedding(row[2], row[3])}
+    except sqlite3.OperationalError:
+        return None
+
+def get_students_version():
+    """Returns the students-table change counter, or 0 if the database is not initialized."""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM app_meta WHERE key = 'students_version'")
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else 0
+    except sqlite3.OperationalError:
+        return 0
+
+# --- GALLERY SNAPSHOT ---
+
+@contextmanager
+def _snapshot_export_lock():
+    """Serializes snapshot exports across processes (where fcntl is available)."""
+    with open(SNAPSHOT_LOCK, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _write_atomically(path, write):
+    """Writes through a temp file private to this writer, then renames it over path."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _read_snapshot_pointer():
+    try:
+        with open(SNAPSHOT_POINTER) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def export_gallery_snapshot():
+    """
+    Writes every student's L2-normalized embedding to an .npy matrix plus a JSON sidecar
+    (roll_no, name, class per row), tagged with the students-table change counter.
+    Worker processes np.load() it with mmap_mode='r', so they all share one page-cached copy.
+    Returns the snapshot version.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    # Read the counter and the rows in one transaction so they describe the same table state
+    cursor.execute("BEGIN")
+    cursor.execute("SELECT value FROM app_meta WHERE key = 'students_version'")
+    row = cursor.fetchone()
+    version = row[0] if row else 0
+    cursor.execute("SELECT roll_no, name, student_class, arcface_embedding, embedding_dim, embedding_model FROM students ORDER BY roll_no")
+    rows = cursor.fetchall()
+    conn.rollback()
+    conn.close()
+
+    matrix, loaded = _embeddings_to_matrix(rows, 3, 4, 5)
+    if len(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-12)
+    sidecar = {
+        "version": version,
+        "dim": int(matrix.shape[1]),
+        "roll_nos": [rows[i][0] for i in loaded],
+        "names": [rows[i][1] for i in loaded],
+        "classes": [rows[i][2] for i in loaded],
+    }
+
+    os.makedirs(SNAPSHOT_FOLDER, exist_ok=True)
+    matrix_path = os.path.join(SNAPSHOT_FOLDER, f"embeddings_v{version}.npy")
+    sidecar_path = os.path.join(SNAPSHOT_FOLDER, f"students_v{version}.json")
+    # Several processes may export at once: each writes its own temp files and renames them,
+    # so readers never see a half-written snapshot, and the lock orders pointer updates and cleanup
+    with _snapshot_export_lock():
+        _write_atomically(matrix_path, lambda f: np.save(f, matrix))
+        _write_atomically(sidecar_path, lambda f: f.write(json.dumps(sidecar).encode()))
+        current = _read_snapshot_pointer()
+        if current is None or current["version"] <= version:
+            pointer = {"version": version, "matrix": os.path.basename(matrix_path), "sidecar": os.path.basename(sidecar_path)}
+            _write_atomically(SNAPSHOT_POINTER, lambda f: f.write(json.dumps(pointer).encode()))
+            current = pointer
+
+        # Older snapshots may still be mapped by running workers; unlinking is safe on POSIX.
+        # Whatever the pointer names is never removed, nor other writers' temp files.
+        keep = {current["matrix"], current["sidecar"], os.path.basename(SNAPSHOT_POINTER)}
+        for file_name in os.listdir(SNAPSHOT_FOLDER):
+            if file_name.endswith((".npy", ".json")) and file_name not in keep:
+                try:
+                    os.remove(os.path.join(SNAPSHOT_FOLDER, file_name))
+                except OSError:
+                    pass
+    print(f"Exported gallery snapshot v{version} with {len(loaded)} students.")
+    return version
+
+def load_gallery_snapshot(require_current=True):
+    """
+    Memory-maps the latest gallery snapshot. Returns {"version", "roll_nos", "names",
+    "classes", "matrix"} or None when there is no snapshot, or (with require_current)
+    when the students table has changed since it was written.
+    """
+    try:
+        with open(SNAPSHOT_POINTER) as f:
+            pointer = json.load(f)
+        if require_current and pointer["version"] != get_students_version():
+            return None
+        with open(os.path.join(SNAPSHOT_FOLDER, pointer["sidecar"])) as f:
+            sidecar = json.load(f)
+        matrix_path = os.path.join(SNAPSHOT_FOLDER, pointer["matrix"])
+        # An empty array cannot be memory-mapped
+        matrix = np.load(matrix_path, mmap_mode='r') if sidecar["roll_nos"] else np.load(matrix_path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return {
+        "version": sidecar["version"], "roll_nos": sidecar["roll_nos"], "names": sidecar["names"],
+        "classes": sidecar["classes"], "matrix": matrix,
+    }
+
 def get_all_students_for_management():
     """Fetches all students, JOINS department to get the code."""
     try:
@@ -191,15 +470,18 @@ def delete_student(roll_no: str):
     cursor.execute("DELETE FROM students WHERE roll_no = ?", (roll_no,))
     conn.commit()
     conn.close()
+    if cursor.rowcount > 0:
+        _notify_students_changed("delete", roll_no)
     return cursor.rowcount > 0
 
 # --- ATTENDANCE & TIMETABLE ---
 
-def record_attendance(roll_no, name, lecture_details):
+def record_attendance(roll_no, name, lecture_details, attendance_date=None, timestamp=None):
+    """Records one student as present. attendance_date / timestamp default to now; recorded lectures pass their own."""
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
-    today = date.today().isoformat()
-    now_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    today = attendance_date or date.today().isoformat()
+    now_timestamp = timestamp or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     cursor.execute('''
         INSERT OR IGNORE INTO attendance_records 
         (roll_no, name, attendance_date, subject, teacher, hall, time_slot, timestamp)
@@ -494,6 +776,8 @@ def update_student(roll_no: str, name: str, student_class: str, parent_phone_num
         )
         conn.commit()
         conn.close()
+        if cursor.rowcount > 0:
+            _notify_students_changed("update", roll_no)
         return cursor.rowcount > 0
     except Exception as e:
         print(f"Database error updating student: {e}")
@@ -597,14 +881,27 @@ def get_student_class(roll_no: str):
     conn.close()
     return result[0] if result else None
 
+def get_student_class_map():
+    """Returns {roll_no: student_class} for every student, without loading embeddings."""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.cursor()
+        cursor.execute("SELECT roll_no, student_class FROM students")
+        rows = cursor.fetchall()
+        conn.close()
+        return {row[0]: row[1] for row in rows}
+    except sqlite3.OperationalError:
+        return {}
+
 def get_student_data_by_class(student_class: str):
     """Get student data filtered by class for attendance verification."""
     try:
         conn = sqlite3.connect(DB_FILE)
         cursor = conn.cursor()
-        cursor.execute("SELECT roll_no, name, arcface_embedding FROM students WHERE student_class = ?", (student_class,))
+        cursor.execute("SELECT roll_no, name, arcface_embedding, embedding_dim, embedding_model FROM students WHERE student_class = ?", (student_class,))
         rows = cursor.fetchall()
         conn.close()
-        return {row[0]: {"name": row[1], "arcface_embedding": pickle.loads(row[2])} for row in rows}
+        matrix, loaded = _embeddings_to_matrix(rows, 2, 3, 4)
+        return {rows[i][0]: {"name": rows[i][1], "arcface_embedding": matrix[j]} for j, i in enumerate(loaded)}
     except sqlite3.OperationalError:
         return {}
\ No newline at end of file
@@ -0,0 +1,119 @@
+# backend/embedding_cache.py (Perceptual-Hash Crop Embedding Cache)
+import time
+import logging
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+
+from .face_detection import crop_box
+
+logger = logging.getLogger(__name__)
+
+# What a cached crop produced: its embedding, its MatchResult and the id of that embedding
+CachedEmbedding = namedtuple("CachedEmbedding", ["embedding", "result", "embedding_id"])
+
+
+def perceptual_hash(crop, hash_size=8):
+    """64-bit DCT hash of a face crop: near-identical crops differ in only a few bits."""
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    small = cv2.resize(gray, (hash_size * 4, hash_size * 4), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size].flatten()
+    # The DC term only carries overall brightness
+    bits = low[1:] > np.median(low[1:])
+    return int(np.packbits(bits).tobytes().hex(), 16)
+
+
+class CropEmbeddingCache:
+    """
+    LRU cache from face crops to their embedding and gallery match.
+
+    Keys are a perceptual hash of the crop plus a coarse location bucket (the crop centre
+    on a grid x grid raster of the frame). A lookup hits when an entry in the same or a
+    neighbouring bucket is at most max_hamming bits away and younger than ttl seconds,
+    so a seated student re-detected after a broken track is not embedded again.
+
+    Every stored embedding has an id; callers pass the ids a track has already used as
+    `exclude`, so one embedding is never counted twice for the same track.
+    """
+
+    def __init__(self, max_entries=512, ttl=10.0, max_hamming=6, grid=24, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Seconds source for the TTL; offline processing passes the video's own time
+        self.clock = clock
+        self.max_hamming = max_hamming
+        self.grid = grid
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._next_key = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _bucket(self, frame_shape, box):
+        h, w = frame_shape[:2]
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        return int(cx * self.grid / w), int(cy * self.grid / h)
+
+    def _remove(self, key):
+        bucket, _, _, _ = self._entries.pop(key)
+        keys = self._buckets[bucket]
+        keys.discard(key)
+        if not keys:
+            del self._buckets[bucket]
+
+    def lookup(self, frame, box, exclude=()):
+        """Returns (CachedEmbedding or None, key), skipping embedding ids in exclude. Pass the key to put() after a miss."""
+        crop = crop_box(frame, box)
+        if crop.size == 0:
+            return None, None
+        key = (self._bucket(frame.shape, box), perceptual_hash(crop))
+        (bx, by), crop_hash = key
+        now = self.clock()
+        best, best_distance = None, self.max_hamming + 1
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for entry_key in list(self._buckets.get((bx + dx, by + dy), ())):
+                    _, entry_hash, stored_at, value = self._entries[entry_key]
+                    if now - stored_at > self.ttl:
+                        self._remove(entry_key)
+                        self.expirations += 1
+                        continue
+                    if entry_key in exclude:
+                        continue
+                    distance = (entry_hash ^ crop_hash).bit_count()
+                    if distance < best_distance:
+                        best, best_distance = entry_key, distance
+        if best is None:
+            self.misses += 1
+            return None, key
+        self.hits += 1
+        self._entries.move_to_end(best)
+        return self._entries[best][3], key
+
+    def put(self, key, embedding, result):
+        """Stores a freshly computed embedding and its match. Returns the embedding's id (None without a key)."""
+        if key is None:
+            return None
+        bucket, crop_hash = key
+        entry_key = self._next_key
+        self._next_key += 1
+        self._entries[entry_key] = (bucket, crop_hash, self.clock(), CachedEmbedding(embedding, result, entry_key))
+        self._buckets.setdefault(bucket, set()).add(entry_key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        return entry_key
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
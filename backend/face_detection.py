@@ -0,0 +1,167 @@
+# backend/face_detection.py (Face Detection Helpers)
+import os
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import cv2
+import numpy as np
+from deepface import DeepFace
+
+logger = logging.getLogger(__name__)
+
+# Tiled detection settings: grid is (rows, cols), overlap a fraction of a tile, max_side applies per tile
+TilingConfig = namedtuple("TilingConfig", ["grid", "overlap", "max_side"])
+
+
+def downscale_for_detection(frame, max_side):
+    """
+    Shrinks a frame so its longer side is at most max_side pixels. Returns (image, scale),
+    where scale maps detection coordinates back to the original frame; the frame itself
+    is returned unchanged when it is already small enough or max_side is 0.
+    """
+    h, w = frame.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return frame, 1.0
+    scale = max_side / max(h, w)
+    small = cv2.resize(frame, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    return small, scale
+
+
+def detect_faces(frame, detector_backend='retinaface', max_side=0):
+    """
+    Runs the face detector on a BGR frame and returns a list of [x1, y1, x2, y2, confidence]
+    in the frame's own coordinates, followed by left_eye_x, left_eye_y, right_eye_x,
+    right_eye_y when the detector reports eye landmarks. With max_side set, the detector sees a downscaled copy
+    (its cost grows with pixel count), but the boxes still refer to the full-resolution
+    frame, so crops for recognition keep every pixel.
+    """
+    image, scale = downscale_for_detection(frame, max_side)
+    detected_faces = DeepFace.extract_faces(
+        img_path=image, detector_backend=detector_backend, enforce_detection=False
+    )
+    detections = []
+    for face_obj in detected_faces:
+        fa = face_obj['facial_area']
+        x, y, w, h = fa['x'], fa['y'], fa['w'], fa['h']
+        confidence = face_obj['confidence']
+        # With enforce_detection=False DeepFace returns the whole frame with 0 confidence when no face is found
+        if not confidence:
+            continue
+        detection = [x / scale, y / scale, (x + w) / scale, (y + h) / scale, confidence]
+        # Newer DeepFace releases add eye landmarks to facial_area
+        left_eye, right_eye = fa.get('left_eye'), fa.get('right_eye')
+        if left_eye and right_eye:
+            detection.extend([left_eye[0] / scale, left_eye[1] / scale, right_eye[0] / scale, right_eye[1] / scale])
+        detections.append(detection)
+    return detections
+
+
+def crop_box(frame, box):
+    """Cuts an x1, y1, x2, y2 box out of a frame, clipped to the frame borders. Returns a view, not a copy."""
+    x1, y1, x2, y2 = (int(v) for v in box[:4])
+    h, w = frame.shape[:2]
+    return frame[max(y1, 0):min(y2, h), max(x1, 0):min(x2, w)]
+
+
+def tiling_from_config(config, max_side=0):
+    """
+    Builds a TilingConfig from a setting such as {"grid": "2x3", "overlap": 0.2, "max_side": 960}
+    (a bare "2x3" works too). Returns None when tiling is off, i.e. for a 1x1 grid or no setting.
+    """
+    if not config:
+        return None
+    if isinstance(config, str):
+        config = {"grid": config}
+    grid = config.get("grid", "1x1")
+    rows, cols = (int(v) for v in (grid.lower().split("x") if isinstance(grid, str) else grid))
+    if rows * cols <= 1:
+        return None
+    return TilingConfig((rows, cols), float(config.get("overlap", 0.2)), int(config.get("max_side", max_side)))
+
+
+def tile_grid(frame_shape, rows, cols, overlap=0.2):
+    """
+    Splits a frame into rows x cols tiles that overlap their neighbours by the given
+    fraction of a tile, so a face cut by one tile border is whole in the next tile.
+    Returns a list of (x1, y1, x2, y2).
+    """
+    h, w = frame_shape[:2]
+
+    def spans(length, count):
+        if count <= 1:
+            return [(0, length)]
+        size = min(length, int(np.ceil(length / count * (1 + overlap))))
+        starts = np.linspace(0, length - size, count).round().astype(int)
+        return [(int(start), int(start) + size) for start in starts]
+
+    return [(x1, y1, x2, y2) for y1, y2 in spans(h, rows) for x1, x2 in spans(w, cols)]
+
+
+def detect_faces_in_tile(frame, tile, detector_backend='retinaface', max_side=0):
+    """Detects faces inside one tile (or any x1, y1, x2, y2 region) and returns them in full-frame coordinates."""
+    x1, y1, x2, y2 = tile
+    detections = detect_faces(np.ascontiguousarray(frame[y1:y2, x1:x2]), detector_backend, max_side)
+    # Every column except the confidence is an x or y coordinate
+    offsets = [x1, y1, x1, y1, 0, x1, y1, x1, y1]
+    return [[value + offset for value, offset in zip(det, offsets)] for det in detections]
+
+
+def non_max_suppression(detections, iou_threshold=0.4, containment_threshold=0.8):
+    """
+    Merges duplicate detections from overlapping tiles, keeping the most confident one.
+    First, a box lying mostly inside a larger box is dropped: that is the partial face a
+    tile border leaves next to the whole face from the neighbouring tile, and its
+    confidence can be higher than the whole face's.
+    """
+    if not detections:
+        return []
+    boxes = np.asarray([det[:5] for det in detections], dtype=np.float64)
+    areas = np.maximum(0, boxes[:, 2] - boxes[:, 0]) * np.maximum(0, boxes[:, 3] - boxes[:, 1])
+    iw = np.maximum(0, np.minimum(boxes[:, None, 2], boxes[None, :, 2]) - np.maximum(boxes[:, None, 0], boxes[None, :, 0]))
+    ih = np.maximum(0, np.minimum(boxes[:, None, 3], boxes[None, :, 3]) - np.maximum(boxes[:, None, 1], boxes[None, :, 1]))
+    inter = iw * ih
+    iou = inter / np.maximum(areas[:, None] + areas[None, :] - inter, 1e-9)
+    # contained[i, j]: box i lies mostly inside the larger box j
+    contained = (inter / np.maximum(areas[:, None], 1e-9) >= containment_threshold) & (areas[:, None] < areas[None, :])
+    alive = ~contained.any(axis=1)
+
+    keep = []
+    for i in np.argsort(-boxes[:, 4]):
+        if alive[i]:
+            keep.append(i)
+            alive &= iou[i] < iou_threshold
+    return [detections[i] for i in keep]
+
+
+_region_executor = None
+_region_executor_lock = Lock()
+
+
+def _get_region_executor():
+    """Threads shared by every in-process pipeline; the detector's TensorFlow calls release the GIL."""
+    global _region_executor
+    with _region_executor_lock:
+        if _region_executor is None:
+            threads = int(os.getenv("DETECTION_THREADS", 0)) or min(4, os.cpu_count() or 1)
+            _region_executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="detect")
+        return _region_executor
+
+
+def detect_faces_in_regions(frame, regions, detector_backend='retinaface', max_side=0):
+    """
+    Detects inside every region in parallel on in-process threads. Returns the faces of
+    all regions, unmerged. InferencePool.detect_regions is the multi-process equivalent.
+    """
+    if len(regions) == 1:
+        return detect_faces_in_tile(frame, regions[0], detector_backend, max_side)
+    executor = _get_region_executor()
+    futures = [executor.submit(detect_faces_in_tile, frame, region, detector_backend, max_side) for region in regions]
+    return [det for future in futures for det in future.result()]
+
+
+def detect_faces_tiled(frame, tiling, detector_backend='retinaface'):
+    """Detects on every tile in parallel on in-process threads and merges the faces with NMS. See InferencePool.detect_tiles."""
+    tiles = tile_grid(frame.shape, *tiling.grid, tiling.overlap)
+    return non_max_suppression(detect_faces_in_regions(frame, tiles, detector_backend, tiling.max_side))
@@ -0,0 +1,88 @@
+# backend/face_embedder.py (Batched Face Embedding)
+import logging
+from threading import Lock
+
+import cv2
+import numpy as np
+from deepface import DeepFace
+
+logger = logging.getLogger(__name__)
+
+
+def _resize_with_padding(face_crop, target_h, target_w):
+    """Same aspect-preserving resize + zero padding DeepFace applies before its recognition models."""
+    h, w = face_crop.shape[:2]
+    factor = min(target_h / h, target_w / w)
+    new_w, new_h = max(1, int(w * factor)), max(1, int(h * factor))
+    resized = cv2.resize(face_crop, (new_w, new_h))
+
+    pad_h, pad_w = target_h - new_h, target_w - new_w
+    padded = np.pad(
+        resized,
+        ((pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)),
+        mode='constant'
+    )
+    if padded.shape[:2] != (target_h, target_w):
+        padded = cv2.resize(padded, (target_w, target_h))
+    return padded
+
+
+class BatchEmbedder:
+    """
+    Embeds all face crops of a frame with a single forward pass of the recognition model,
+    instead of one DeepFace.represent call (and its preprocessing overhead) per face.
+    """
+
+    def __init__(self, model_name="ArcFace"):
+        self.model_name = model_name
+        self._model = None
+        self._input_hw = None
+        self._lock = Lock()
+
+    def _ensure_model(self):
+        if self._model is not None:
+            return
+        with self._lock:
+            if self._model is not None:
+                return
+            built = DeepFace.build_model(self.model_name)
+            # Newer DeepFace versions wrap the Keras model in a client object
+            model = getattr(built, "model", built)
+            self._input_hw = tuple(int(d) for d in model.input_shape[1:3])
+            self._model = model
+            logger.info(f"{self.model_name} model ready for batched embedding (input {self._input_hw}).")
+
+    @property
+    def input_size(self):
+        self._ensure_model()
+        return self._input_hw
+
+    def preprocess(self, face_crops):
+        """Resizes and normalizes BGR crops into one float32 batch. Returns (batch, indices of usable crops)."""
+        target_h, target_w = self.input_size
+        valid_idx = [i for i, crop in enumerate(face_crops) if crop is not None and crop.size > 0 and crop.ndim == 3]
+        batch = np.empty((len(valid_idx), target_h, target_w, 3), dtype=np.float32)
+        for row, i in enumerate(valid_idx):
+            batch[row] = _resize_with_padding(face_crops[i], target_h, target_w)
+        batch /= 255.0
+        return batch, valid_idx
+
+    def embed(self, face_crops):
+        """
+        Returns a list with one embedding (float32 array) per crop, or None for crops
+        that were empty or could not be embedded.
+        """
+        embeddings = [None] * len(face_crops)
+        if not face_crops:
+            return embeddings
+        try:
+            batch, valid_idx = self.preprocess(face_crops)
+            if not valid_idx:
+                return embeddings
+            output = np.asarray(self._model(batch, training=False), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Batched embedding failed for {len(face_crops)} crops: {e}")
+            return embeddings
+        for row, i in enumerate(valid_idx):
+            embeddings[i] = output[row]
+        return embeddings
@@ -0,0 +1,95 @@
+# backend/face_matcher.py (Vectorized Gallery Matching)
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MatchResult = namedtuple("MatchResult", ["roll_no", "distance", "second_distance", "confidence_gap"])
+
+
+def normalize_rows(matrix):
+    """L2-normalizes each row of a 2D float32 array. Zero rows stay zero."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    return matrix / norms
+
+
+class GalleryMatcher:
+    """
+    Holds every enrolled embedding as one contiguous, L2-normalized float32 matrix
+    with a parallel roll_no array, so a whole batch of faces is scored with a single
+    matrix multiply instead of one scipy cosine call per student.
+    """
+
+    def __init__(self, roll_nos, embeddings, normalized=False):
+        self.roll_nos = np.asarray(list(roll_nos), dtype=object)
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(self.roll_nos), -1)
+        # Already-normalized matrices (e.g. a memory-mapped gallery snapshot) are used without copying
+        self.matrix = matrix if normalized else np.ascontiguousarray(normalize_rows(matrix))
+        self._index = {roll_no: i for i, roll_no in enumerate(self.roll_nos)}
+
+    @classmethod
+    def from_student_db(cls, student_db):
+        """Builds a matcher from the {roll_no: {"arcface_embedding": ...}} dicts used by database_handler."""
+        roll_nos, embeddings = [], []
+        for roll_no, data in student_db.items():
+            embedding = data.get("arcface_embedding")
+            if embedding is None:
+                continue
+            roll_nos.append(roll_no)
+            embeddings.append(np.asarray(embedding, dtype=np.float32).ravel())
+        if not embeddings:
+            return cls([], np.empty((0, 0), dtype=np.float32))
+        return cls(roll_nos, np.stack(embeddings))
+
+    def __len__(self):
+        return len(self.roll_nos)
+
+    def __contains__(self, roll_no):
+        return roll_no in self._index
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def distances(self, queries):
+        """Returns the (faces x students) cosine distance matrix for a batch of query embeddings."""
+        queries = normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        return 1.0 - queries @ self.matrix.T
+
+    def match(self, queries):
+        """
+        Scores a batch of query embeddings and returns one MatchResult per query with
+        the top-1 roll_no, its distance, the runner-up distance and the confidence gap.
+        The threshold decision is left to the caller.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.size == 0:
+            return []
+        queries = np.atleast_2d(queries)
+        n_queries, n_students = len(queries), len(self)
+        if n_students == 0:
+            return [MatchResult(None, float('inf'), float('inf'), 0.0) for _ in range(n_queries)]
+
+        dist = self.distances(queries)
+        rows = np.arange(n_queries)
+        if n_students == 1:
+            best_idx = np.zeros(n_queries, dtype=np.intp)
+            best = dist[:, 0]
+            second = np.full(n_queries, np.inf, dtype=np.float32)
+        else:
+            top2 = np.argpartition(dist, 1, axis=1)[:, :2]
+            top2_dist = dist[rows[:, None], top2]
+            order = np.argsort(top2_dist, axis=1)
+            best_idx = top2[rows, order[:, 0]]
+            best = top2_dist[rows, order[:, 0]]
+            second = top2_dist[rows, order[:, 1]]
+
+        return [
+            MatchResult(self.roll_nos[i], float(d1), float(d2), float(d2 - d1))
+            for i, d1, d2 in zip(best_idx, best, second)
+        ]
@@ -0,0 +1,87 @@
+# backend/face_quality.py (Face Quality Gating)
+import logging
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from .face_detection import crop_box
+
+logger = logging.getLogger(__name__)
+
+# score is in [0, 1]; reason is None when the face is good enough to embed
+FaceQuality = namedtuple("FaceQuality", ["score", "size", "confidence", "sharpness", "pose", "reason"])
+
+
+class FaceQualityGate:
+    """
+    Scores a detected face before it is sent to the recognition model, so tiny, blurred
+    or turned faces do not cost an ArcFace pass and do not produce unreliable embeddings.
+
+    Checks box size, detector confidence, sharpness (variance of the Laplacian on a crop
+    resized to a fixed size, so it does not depend on distance from the camera) and,
+    when the detector reports eye landmarks, head pose: yaw from how far the eyes'
+    midpoint sits from the box centre, roll from the tilt of the eye line.
+    """
+
+    def __init__(self, min_size=40, min_confidence=0.5, min_sharpness=30.0, max_yaw=0.3, max_roll=25.0, sharpness_size=64):
+        self.min_size = min_size
+        self.min_confidence = min_confidence
+        self.min_sharpness = min_sharpness
+        # Eye-midpoint offset from the box centre, as a fraction of the box width
+        self.max_yaw = max_yaw
+        # Eye-line angle in degrees
+        self.max_roll = max_roll
+        self.sharpness_size = sharpness_size
+        self.faces_checked = 0
+        self.faces_rejected = {}
+
+    def _sharpness(self, frame, box):
+        crop = crop_box(frame, box)
+        if crop.size == 0:
+            return 0.0
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        gray = cv2.resize(gray, (self.sharpness_size, self.sharpness_size), interpolation=cv2.INTER_AREA)
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    def _pose(self, detection):
+        """Returns 1.0 for a frontal face down to 0.0 at the yaw/roll limits, or None without landmarks."""
+        if len(detection) < 9:
+            return None
+        x1, _, x2, _ = detection[:4]
+        lx, ly, rx, ry = detection[5:9]
+        width = max(x2 - x1, 1.0)
+        yaw = abs((lx + rx) / 2 - (x1 + x2) / 2) / width
+        roll = abs(np.degrees(np.arctan2(ry - ly, rx - lx)))
+        roll = min(roll, 180 - roll)
+        return max(0.0, 1.0 - max(yaw / self.max_yaw, roll / self.max_roll))
+
+    def assess(self, frame, detection):
+        """Scores one [x1, y1, x2, y2, confidence, (eye landmarks)] detection of the frame."""
+        self.faces_checked += 1
+        x1, y1, x2, y2, confidence = (float(v) for v in detection[:5])
+        size = min(x2 - x1, y2 - y1)
+        sharpness = self._sharpness(frame, detection) if size >= self.min_size else 0.0
+        pose = self._pose(detection)
+
+        reason = None
+        if size < self.min_size:
+            reason = "too_small"
+        elif confidence < self.min_confidence:
+            reason = "low_confidence"
+        elif sharpness < self.min_sharpness:
+            reason = "blurred"
+        elif pose is not None and pose <= 0.0:
+            reason = "turned"
+        if reason:
+            self.faces_rejected[reason] = self.faces_rejected.get(reason, 0) + 1
+
+        score = (min(1.0, size / max(2 * self.min_size, 1e-9)) * min(1.0, confidence)
+                 * min(1.0, sharpness / max(2 * self.min_sharpness, 1e-9)) * (1.0 if pose is None else pose))
+        return FaceQuality(score, size, confidence, sharpness, pose, reason)
+
+    def get_stats(self):
+        return {
+            "faces_checked": self.faces_checked,
+            "faces_rejected": dict(self.faces_rejected),
+        }
@@ -0,0 +1,145 @@
+# backend/face_tracker.py (Lightweight Pure-NumPy Face Tracker)
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two (N, 4) and (M, 4) arrays of x1, y1, x2, y2 boxes."""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+def _greedy_assign(score, min_score, higher_is_better=True):
+    """Greedily pairs rows and columns in order of best score. Returns a list of (row, col)."""
+    pairs = []
+    if score.size == 0:
+        return pairs
+    flat_order = np.argsort(-score if higher_is_better else score, axis=None)
+    used_rows, used_cols = set(), set()
+    for flat_idx in flat_order:
+        r, c = np.unravel_index(flat_idx, score.shape)
+        value = score[r, c]
+        if (higher_is_better and value < min_score) or (not higher_is_better and value > min_score):
+            break
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        pairs.append((int(r), int(c)))
+    return pairs
+
+
+class FaceTracker:
+    """
+    Assigns stable track IDs to face detections across processed frames.
+
+    Detections are associated first by IoU and then, for faces that moved further
+    than their own size between processed frames, by centroid distance. Both stages
+    use a greedy matcher, so no compiled `lap` dependency is needed.
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_gate=1.0, max_missed=10):
+        self.iou_threshold = iou_threshold
+        # Maximum centroid shift, relative to the track's box size, for the fallback stage
+        self.centroid_gate = centroid_gate
+        self.max_missed = max_missed
+        self._boxes = np.empty((0, 4), dtype=np.float32)
+        self._ids = []
+        self._missed = []
+        self._scores = []
+        self._next_id = 1
+        self.removed_ids = []
+        self.last_matches = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _associate(self, det_boxes):
+        matches = _greedy_assign(iou_matrix(self._boxes, det_boxes), self.iou_threshold)
+        matched_tracks = {t for t, _ in matches}
+        matched_dets = {d for _, d in matches}
+
+        rest_tracks = [t for t in range(len(self._ids)) if t not in matched_tracks]
+        rest_dets = [d for d in range(len(det_boxes)) if d not in matched_dets]
+        if rest_tracks and rest_dets:
+            tb = self._boxes[rest_tracks]
+            db = det_boxes[rest_dets]
+            t_centers = (tb[:, :2] + tb[:, 2:]) / 2
+            d_centers = (db[:, :2] + db[:, 2:]) / 2
+            t_sizes = np.sqrt(np.maximum((tb[:, 2] - tb[:, 0]) * (tb[:, 3] - tb[:, 1]), 1.0))
+            dist = np.linalg.norm(t_centers[:, None, :] - d_centers[None, :, :], axis=2) / t_sizes[:, None]
+            for r, c in _greedy_assign(dist, self.centroid_gate, higher_is_better=False):
+                matches.append((rest_tracks[r], rest_dets[c]))
+        return matches
+
+    def update(self, detections):
+        """
+        Updates the tracker with one frame of detections, an (N, 5) array-like of
+        x1, y1, x2, y2, confidence. Returns an (M, 6) array of x1, y1, x2, y2, track_id,
+        confidence for the tracks seen in this frame. Extra columns after the confidence
+        are ignored. IDs of tracks that expired are left in `removed_ids` and the index of
+        the detection each track was matched to in `last_matches`, until the next update.
+        """
+        dets = np.asarray([d[:5] for d in detections], dtype=np.float32).reshape(-1, 5) if len(detections) else np.empty((0, 5), dtype=np.float32)
+        det_boxes = dets[:, :4]
+        self.removed_ids = []
+        self.last_matches = {}
+
+        matches = self._associate(det_boxes)
+        matched_tracks = {t for t, _ in matches}
+        matched_dets = {d for _, d in matches}
+
+        for t, d in matches:
+            self.last_matches[self._ids[t]] = d
+            self._boxes[t] = det_boxes[d]
+            self._missed[t] = 0
+            self._scores[t] = float(dets[d, 4])
+
+        for t in range(len(self._ids)):
+            if t not in matched_tracks:
+                self._missed[t] += 1
+
+        new_dets = [d for d in range(len(dets)) if d not in matched_dets]
+        if new_dets:
+            self._boxes = np.vstack([self._boxes, det_boxes[new_dets]])
+            for d in new_dets:
+                self.last_matches[self._next_id] = d
+                self._ids.append(self._next_id)
+                self._missed.append(0)
+                self._scores.append(float(dets[d, 4]))
+                self._next_id += 1
+
+        keep = [i for i, missed in enumerate(self._missed) if missed <= self.max_missed]
+        if len(keep) != len(self._ids):
+            self.removed_ids = [self._ids[i] for i in range(len(self._ids)) if self._missed[i] > self.max_missed]
+            self._boxes = self._boxes[keep]
+            self._ids = [self._ids[i] for i in keep]
+            self._missed = [self._missed[i] for i in keep]
+            self._scores = [self._scores[i] for i in keep]
+
+        return self.current()
+
+    def current(self):
+        """
+        Returns the tracks seen in the last update, in update()'s format, without changing
+        any state. Used to carry tracks forward through frames known to be unchanged.
+        """
+        online = [i for i, missed in enumerate(self._missed) if missed == 0]
+        if not online:
+            return np.empty((0, 6))
+        out = np.empty((len(online), 6))
+        out[:, :4] = self._boxes[online]
+        out[:, 4] = [self._ids[i] for i in online]
+        out[:, 5] = [self._scores[i] for i in online]
+        return out
@@ -0,0 +1,157 @@
+# backend/frame_ring.py (Shared-Memory Frame Ring Buffer)
+import os
+import logging
+from collections import namedtuple
+from multiprocessing import shared_memory
+from threading import Lock
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# A frame handed between stages by reference: the ring it lives in and its sequence number
+FrameRef = namedtuple("FrameRef", ["ring", "seq"])
+
+SHM_PATH = "/dev/shm"
+
+
+def _check_shared_memory(nbytes):
+    """
+    Raises MemoryError when /dev/shm cannot hold nbytes more. Its pages are only backed on
+    first write, so an oversized block would otherwise kill the process with SIGBUS later
+    (Docker's default /dev/shm is 64 MB).
+    """
+    if not os.path.isdir(SHM_PATH):
+        return
+    stats = os.statvfs(SHM_PATH)
+    available = stats.f_bavail * stats.f_frsize
+    if nbytes > available:
+        raise MemoryError(
+            f"Not enough shared memory for a {nbytes / 2**20:.0f} MB frame ring: {available / 2**20:.0f} MB free in {SHM_PATH}. "
+            f"Enlarge it (e.g. docker --shm-size) or lower CAPTURE_RING_SLOTS."
+        )
+
+
+class FrameRing:
+    """
+    Fixed-size frame slots in one multiprocessing.shared_memory block.
+
+    A producer writes each frame once, straight into a slot, and publishes it under an
+    increasing sequence number. Consumers (inference, worker processes, the MJPEG
+    streamer) pin a slot by sequence number and read it in place; the producer never
+    reuses a pinned slot, so a pinned frame stays valid until it is released. If every
+    slot is pinned, the producer has to drop the frame.
+
+    With shared=False the slots are a plain NumPy array: same API, but no /dev/shm use
+    and no ref() for other processes. Use it when every consumer is in this process.
+    """
+
+    def __init__(self, shape, slots=4, dtype=np.uint8, shared=True):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self.shared = shared
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._shm = None
+        if shared:
+            _check_shared_memory(self.frame_bytes * slots)
+            self._shm = shared_memory.SharedMemory(create=True, size=self.frame_bytes * slots)
+            self._frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=self._shm.buf)
+        else:
+            self._frames = np.empty((slots,) + self.shape, dtype=self.dtype)
+        self._slot_seq = [0] * slots
+        self._pins = [0] * slots
+        self._last_slot = -1
+        self._next_seq = 1
+        self._lock = Lock()
+        self.latest_seq = 0
+        self.frames_written = 0
+        self.writes_blocked = 0
+
+    @property
+    def name(self):
+        return self._shm.name if self._shm is not None else None
+
+    def begin_write(self):
+        """Reserves the next free slot and returns (slot, writable view), or (None, None) if every slot is pinned."""
+        with self._lock:
+            for step in range(1, self.slots + 1):
+                slot = (self._last_slot + step) % self.slots
+                if self._pins[slot] == 0:
+                    # Invalidate the slot's old frame while it is being overwritten
+                    self._slot_seq[slot] = 0
+                    self._last_slot = slot
+                    return slot, self._frames[slot]
+            self.writes_blocked += 1
+            return None, None
+
+    def commit(self, slot):
+        """Publishes the frame written into a reserved slot and returns its sequence number."""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._slot_seq[slot] = seq
+            self.latest_seq = seq
+            self.frames_written += 1
+            return seq
+
+    def write(self, frame):
+        """Copies a frame into the next free slot. Returns its sequence number, or None if every slot is pinned."""
+        slot, view = self.begin_write()
+        if slot is None:
+            return None
+        np.copyto(view, frame)
+        return self.commit(slot)
+
+    def acquire(self, seq):
+        """
+        Pins the frame with this sequence number and returns a view of it (do not write
+        to it), or None if it was already overwritten. Every acquire needs a release.
+        """
+        with self._lock:
+            if self._frames is None:
+                return None
+            for slot, slot_seq in enumerate(self._slot_seq):
+                if slot_seq == seq:
+                    self._pins[slot] += 1
+                    return self._frames[slot]
+            return None
+
+    def release(self, seq):
+        with self._lock:
+            for slot, slot_seq in enumerate(self._slot_seq):
+                if slot_seq == seq and self._pins[slot] > 0:
+                    self._pins[slot] -= 1
+                    return
+
+    def ref(self, seq):
+        """Cross-process reference (shm name, shape, dtype, byte offset) to a pinned frame."""
+        if self._shm is None:
+            raise ValueError("A FrameRing created with shared=False has no cross-process references.")
+        with self._lock:
+            slot = self._slot_seq.index(seq)
+        return (self.name, self.shape, self.dtype.str, slot * self.frame_bytes)
+
+    def get_stats(self):
+        return {
+            "slots": self.slots,
+            "frames_written": self.frames_written,
+            "writes_blocked": self.writes_blocked,
+            "pinned": sum(1 for p in self._pins if p),
+        }
+
+    def close(self):
+        with self._lock:
+            self._frames = None
+            self._slot_seq = [0] * self.slots
+        if self._shm is None:
+            return
+        try:
+            self._shm.close()
+        except BufferError:
+            # A consumer still holds a view; the mapping goes away with it
+            pass
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
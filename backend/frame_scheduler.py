@@ -0,0 +1,73 @@
+# backend/frame_scheduler.py (Adaptive Frame Scheduling)
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveFrameScheduler:
+    """
+    Decides which incoming frames get full detection + embedding.
+
+    Instead of a fixed FRAME_SKIP, it measures how long each processed frame takes and
+    how fast frames arrive, and picks the skip rate that keeps inference within a
+    processing budget: either a fraction of one core (cpu_budget=0.5 means inference may
+    be busy half of the time) or, if target_fps is set, a fixed number of processed
+    frames per second. Once every expected student is confirmed it drops to idle_skip.
+    """
+
+    def __init__(self, initial_skip=5, min_skip=1, max_skip=30, cpu_budget=0.5, target_fps=None,
+                 idle_skip=60, adaptive=True, smoothing=0.2):
+        self.skip = max(1, initial_skip)
+        self.min_skip = max(1, min_skip)
+        self.max_skip = max(self.min_skip, max_skip)
+        self.cpu_budget = cpu_budget
+        self.target_fps = target_fps
+        self.idle_skip = idle_skip
+        self.adaptive = adaptive
+        self.smoothing = smoothing
+        self.idle = False
+        self.latency = None
+        self.input_fps = None
+        self._frames_since_processed = 0
+
+    def should_process(self):
+        """Call once per incoming frame; returns True when this frame should be processed."""
+        self._frames_since_processed += 1
+        current_skip = self.idle_skip if self.idle else self.skip
+        if self._frames_since_processed >= current_skip:
+            self._frames_since_processed = 0
+            return True
+        return False
+
+    def record_latency(self, seconds, input_fps):
+        """
+        Feeds back the wall-clock time one processed frame took, and the rate frames
+        arrive at, and retunes the skip rate. Skipped frames are consumed at the input
+        rate, so skip - 1 frames buy (skip - 1) / input_fps seconds of idle time.
+        """
+        self.latency = seconds if self.latency is None else self.latency + self.smoothing * (seconds - self.latency)
+        self.input_fps = input_fps
+        if not self.adaptive or not input_fps or self.latency <= 0:
+            return
+        if self.target_fps:
+            idle_needed = max(0.0, 1.0 / self.target_fps - self.latency)
+        else:
+            idle_needed = self.latency * (1.0 - self.cpu_budget) / self.cpu_budget
+        new_skip = min(self.max_skip, max(self.min_skip, 1 + math.ceil(idle_needed * input_fps)))
+        if new_skip != self.skip:
+            logger.debug(f"Frame skip {self.skip} -> {new_skip} (latency {self.latency * 1000:.0f} ms, input {self.input_fps:.1f} fps)")
+            self.skip = new_skip
+
+    def set_idle(self, idle):
+        if idle != self.idle:
+            logger.info(f"Frame scheduler {'entering' if idle else 'leaving'} idle cadence (skip {self.idle_skip}).")
+        self.idle = idle
+
+    def get_stats(self):
+        return {
+            "frame_skip": self.idle_skip if self.idle else self.skip,
+            "idle": self.idle,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "input_fps": round(self.input_fps, 1) if self.input_fps is not None else None,
+        }
@@ -0,0 +1,182 @@
+# backend/frame_source.py (Decoupled Video Capture)
+import os
+import time
+import logging
+from threading import Condition, Thread
+
+import cv2
+import numpy as np
+
+from .frame_ring import FrameRing
+
+logger = logging.getLogger(__name__)
+
+
+def is_live_source(video_source):
+    """Cameras (device indexes) and network streams are live; anything else is treated as a file."""
+    source = str(video_source)
+    return source.isdigit() or "://" in source
+
+
+class LatestFrameCapture:
+    """
+    Reads a video source on its own thread and always hands inference the newest frame,
+    so the pipeline never drains a backlog from the driver or RTSP buffer.
+
+    Frames are decoded straight into the slots of a FrameRing, so they are written
+    exactly once; inference, worker processes and the MJPEG streamer all read them in
+    place by sequence number. The ring lives in shared memory only with shared=True,
+    i.e. when worker processes read from it.
+
+    With drop_frames=False (used for video files) the reader thread waits until the
+    newest frame is consumed, so every frame is delivered in order.
+    """
+
+    def __init__(self, video_source, drop_frames=None, ring_slots=None, shared=True):
+        self.video_source = str(video_source)
+        self.drop_frames = is_live_source(self.video_source) if drop_frames is None else drop_frames
+        # Enough slots for the frame being inferred, one being streamed and a few in flight
+        self.ring_slots = ring_slots or int(os.getenv("CAPTURE_RING_SLOTS", 6))
+        self.shared = shared
+        self.ring = None
+        self._capture = None
+        self._thread = None
+        self._cond = Condition()
+        self._delivered_seq = 0
+        self._running = False
+        self.ended = False
+        self.frames_read = 0
+        self.frames_delivered = 0
+        self.frames_dropped = 0
+        self._started_at = None
+
+    def start(self):
+        """Opens the source and starts the reader thread. Returns False if the source cannot be opened."""
+        source = int(self.video_source) if self.video_source.isdigit() else self.video_source
+        self._capture = cv2.VideoCapture(source)
+        if not self._capture.isOpened():
+            self._capture.release()
+            return False
+        # The first frame fixes the slot size of the ring
+        ret, first_frame = self._capture.read()
+        if not ret:
+            self._capture.release()
+            return False
+        try:
+            self.ring = FrameRing(first_frame.shape, slots=self.ring_slots, dtype=first_frame.dtype, shared=self.shared)
+        except MemoryError as e:
+            logger.error(f"Cannot buffer frames of '{self.video_source}': {e}")
+            self._capture.release()
+            return False
+        self.ring.write(first_frame)
+        self._publish()
+
+        self._running = True
+        self._started_at = time.time()
+        self._thread = Thread(target=self._reader, name="frame-capture", daemon=True)
+        self._thread.start()
+        return True
+
+    def _publish(self):
+        with self._cond:
+            self.frames_read += 1
+            self._cond.notify_all()
+
+    def _reader(self):
+        scratch = None
+        try:
+            while self._running:
+                if not self.drop_frames:
+                    with self._cond:
+                        while self._running and self.ring.latest_seq > self._delivered_seq:
+                            self._cond.wait(0.5)
+
+                slot, view = self.ring.begin_write()
+                if slot is None:
+                    # Every slot is pinned by a consumer: read into scratch memory and drop the frame
+                    if scratch is None:
+                        scratch = np.empty(self.ring.shape, dtype=self.ring.dtype)
+                    ret, _ = self._capture.read(scratch)
+                    if not ret:
+                        break
+                    with self._cond:
+                        self.frames_read += 1
+                        self.frames_dropped += 1
+                    continue
+
+                # Decode directly into the ring slot
+                ret, frame = self._capture.read(view)
+                if not ret:
+                    break
+                if frame is not view and not np.shares_memory(frame, view):
+                    if frame.shape != self.ring.shape:
+                        logger.error(f"Video source '{self.video_source}' changed resolution to {frame.shape}; stopping capture.")
+                        break
+                    np.copyto(view, frame)
+                self.ring.commit(slot)
+                self._publish()
+        except Exception as e:
+            logger.error(f"Frame capture failed for '{self.video_source}': {e}", exc_info=True)
+        finally:
+            self._capture.release()
+            with self._cond:
+                self.ended = True
+                self._cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """
+        Returns (seq, frame) for the newest frame not yet returned, or (None, None) if none
+        arrived within timeout or the source ended. The frame is pinned in the ring and
+        must be handed back with release(seq).
+        """
+        with self._cond:
+            if self.ring.latest_seq <= self._delivered_seq and not self.ended:
+                self._cond.wait(timeout)
+            seq = self.ring.latest_seq
+            if seq <= self._delivered_seq:
+                return None, None
+            frame = self.ring.acquire(seq)
+            if frame is None:
+                return None, None
+            # Frames published since the last read but never picked up were skipped
+            self.frames_dropped += seq - self._delivered_seq - 1
+            self._delivered_seq = seq
+            self.frames_delivered += 1
+            self._cond.notify_all()
+            return seq, frame
+
+    def release(self, seq):
+        self.ring.release(seq)
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def close(self):
+        """Stops reading and frees the ring."""
+        self.stop()
+        if self.ring is not None:
+            self.ring.close()
+
+    @property
+    def capture_fps(self):
+        if not self._started_at:
+            return 0.0
+        elapsed = time.time() - self._started_at
+        return self.frames_read / elapsed if elapsed > 0 else 0.0
+
+    def get_stats(self):
+        stats = {
+            "source": self.video_source,
+            "drop_frames": self.drop_frames,
+            "frames_read": self.frames_read,
+            "frames_delivered": self.frames_delivered,
+            "frames_dropped": self.frames_dropped,
+            "capture_fps": round(self.capture_fps, 1),
+        }
+        if self.ring is not None:
+            stats["ring"] = self.ring.get_stats()
+        return stats
@@ -0,0 +1,141 @@
+# backend/gallery_cache.py (Process-Wide Student Gallery)
+import logging
+import time
+from threading import RLock
+
+from . import database_handler
+from .face_matcher import GalleryMatcher
+
+logger = logging.getLogger(__name__)
+
+
+class StudentGallery:
+    """
+    In-memory copy of every student's name, class and embedding, owned by the app.
+
+    It is loaded once at startup, preferably by memory-mapping database_handler's gallery
+    snapshot so that every worker process shares one page-cached matrix, and kept current
+    through database_handler's students listeners. A verification session only picks up a
+    ready-made matcher instead of re-reading and unpickling the whole students table.
+    Matchers are cached per scope (one per class, plus the institute-wide one) and rebuilt
+    from memory after a change.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._records = {}
+        self._views = {}
+        self._class_map = None
+        self.is_loaded = False
+        self.version = 0
+        # students-table change counter the cached data corresponds to
+        self.db_version = None
+
+    def _load_snapshot(self):
+        snapshot = database_handler.load_gallery_snapshot()
+        if snapshot is None:
+            try:
+                database_handler.export_gallery_snapshot()
+                snapshot = database_handler.load_gallery_snapshot()
+            except Exception as e:
+                logger.warning(f"Could not export gallery snapshot, loading from the database instead: {e}")
+        return snapshot
+
+    def load(self):
+        """(Re)loads every student, from the current snapshot when possible, and starts listening for changes."""
+        started = time.perf_counter()
+        snapshot = self._load_snapshot()
+        if snapshot is not None:
+            matrix = snapshot["matrix"]
+            records = {
+                roll_no: {"name": name, "student_class": student_class, "arcface_embedding": matrix[i]}
+                for i, (roll_no, name, student_class) in enumerate(zip(snapshot["roll_nos"], snapshot["names"], snapshot["classes"]))
+            }
+            # The institute-wide matcher uses the mapped matrix directly, without a private copy.
+            # The view gets its own dict: running pipelines iterate it while _records changes.
+            views = {None: (dict(records), GalleryMatcher(snapshot["roll_nos"], matrix, normalized=True))}
+            db_version = snapshot["version"]
+        else:
+            db_version = database_handler.get_students_version()
+            records = database_handler.get_all_student_records()
+            views = {}
+        with self._lock:
+            self._records = records
+            self._views = views
+            self._class_map = None
+            self.db_version = db_version
+            self.version += 1
+            self.is_loaded = True
+        database_handler.add_students_listener(self.on_students_changed)
+        source = "snapshot" if snapshot is not None else "database"
+        logger.info(f"Student gallery loaded from {source}: {len(records)} students in {time.perf_counter() - started:.2f}s")
+
+    def ensure_loaded(self):
+        if not self.is_loaded:
+            self.load()
+
+    def refresh_if_stale(self):
+        """Reloads when the students table was changed by another process since this gallery was loaded."""
+        if not self.is_loaded or database_handler.get_students_version() != self.db_version:
+            self.load()
+
+    def on_students_changed(self, event, roll_no=None):
+        """database_handler listener: applies one students-table change to the cached gallery."""
+        if event == "reset":
+            self.load()
+            return
+
+        record = database_handler.get_student_record(roll_no) if event in ("upsert", "update") else None
+        with self._lock:
+            # Copy-on-write, so a view or class map handed out earlier never changes under its reader
+            records = dict(self._records)
+            previous = records.pop(roll_no, None)
+            if record is not None:
+                records[roll_no] = record
+            self._records = records
+            # Only the views that could contain this student need rebuilding
+            for student_class in {None, (previous or {}).get("student_class"), (record or {}).get("student_class")}:
+                self._views.pop(student_class, None)
+            self._class_map = None
+            self.version += 1
+            self.db_version = database_handler.get_students_version()
+        logger.info(f"Student gallery updated ({event} {roll_no}), version {self.version}")
+
+    def _get_view(self, student_class=None):
+        with self._lock:
+            view = self._views.get(student_class)
+            if view is None:
+                student_db = {
+                    roll_no: record for roll_no, record in self._records.items()
+                    if student_class is None or record["student_class"] == student_class
+                }
+                view = (student_db, GalleryMatcher.from_student_db(student_db))
+                self._views[student_class] = view
+            return view
+
+    def get_student_db(self, student_class=None):
+        """
+        Returns {roll_no: {"name", "student_class", "arcface_embedding"}} for one class, or everyone.
+        Embeddings loaded from a snapshot are L2-normalized. Do not mutate.
+        """
+        self.ensure_loaded()
+        return self._get_view(student_class)[0]
+
+    def get_matcher(self, student_class=None):
+        """Returns the cached GalleryMatcher for one class, or for the whole institute."""
+        self.ensure_loaded()
+        return self._get_view(student_class)[1]
+
+    def get_class_map(self):
+        """Returns {roll_no: student_class} for every student. Do not mutate."""
+        self.ensure_loaded()
+        with self._lock:
+            if self._class_map is None:
+                self._class_map = {roll_no: record["student_class"] for roll_no, record in self._records.items()}
+            return self._class_map
+
+    def __len__(self):
+        return len(self._records)
+
+
+gallery = StudentGallery()
@@ -0,0 +1,93 @@
+# backend/identity_voting.py (Multi-Frame Identity Voting)
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class TrackIdentity:
+    """
+    Identity evidence gathered for one track.
+
+    status is "pending" while views are being collected, "confirmed" once the vote is
+    decided (roll_no is then final) and "unknown" when max_views gave no decision.
+    While pending, roll_no is the leading candidate, or "Unknown".
+    """
+
+    def __init__(self):
+        self.status = "pending"
+        self.roll_no = "Unknown"
+        self.views = 0
+        # Best-match roll_no (None when the gallery was empty) -> distances of the views that voted for it
+        self.votes = {}
+        self.best_quality = 0.0
+        self.last_embedded = None
+        # Crop-cache embedding ids this track has voted with, so none of them is counted twice
+        self.embedding_ids = set()
+
+
+class IdentityVoter:
+    """
+    Per-track embedding policy. A track is re-embedded only when its face quality has
+    improved noticeably or reembed_interval processed frames have passed, and at most
+    max_views times. Each view votes for its best gallery match. A track is confirmed
+    once one student has at least min_views votes, holds the majority of the track's
+    views, and the mean distance of those views is under the recognition threshold.
+    After that the track is never embedded again, so compute per person is bounded.
+    """
+
+    def __init__(self, threshold, min_views=2, max_views=6, reembed_interval=10, quality_gain=0.15):
+        self.threshold = threshold
+        self.min_views = max(1, min_views)
+        self.max_views = max(self.min_views, max_views)
+        self.reembed_interval = reembed_interval
+        self.quality_gain = quality_gain
+        self.tracks_confirmed = 0
+        self.tracks_unknown = 0
+
+    def wants_embedding(self, identity, frame_index, quality_score=None):
+        if identity.status != "pending":
+            return False
+        if identity.last_embedded is None:
+            return True
+        if quality_score is not None and quality_score > identity.best_quality * (1 + self.quality_gain):
+            return True
+        return frame_index - identity.last_embedded >= self.reembed_interval
+
+    def mark_attempt(self, identity, frame_index):
+        """Records an embedding attempt that produced no embedding, so it is retried only after the interval."""
+        identity.last_embedded = frame_index
+
+    def add_view(self, identity, result, frame_index, quality_score=None):
+        """Adds one MatchResult for the track. Returns True when this view confirmed the identity."""
+        identity.views += 1
+        identity.last_embedded = frame_index
+        if quality_score is not None:
+            identity.best_quality = max(identity.best_quality, quality_score)
+        identity.votes.setdefault(result.roll_no, []).append(float(result.distance))
+
+        candidates = [(roll_no, distances) for roll_no, distances in identity.votes.items() if roll_no is not None]
+        if candidates:
+            roll_no, distances = max(candidates, key=lambda c: (len(c[1]), -np.mean(c[1])))
+            mean_distance = float(np.mean(distances))
+            identity.roll_no = roll_no if mean_distance < self.threshold else "Unknown"
+            if len(distances) >= self.min_views and 2 * len(distances) > identity.views and mean_distance < self.threshold:
+                identity.status = "confirmed"
+                self.tracks_confirmed += 1
+                logger.debug(f"Track confirmed as {roll_no} after {identity.views} views (mean distance {mean_distance:.3f})")
+                return True
+
+        if identity.views >= self.max_views:
+            identity.status = "unknown"
+            identity.roll_no = "Unknown"
+            self.tracks_unknown += 1
+        return False
+
+    def get_stats(self):
+        return {
+            "tracks_confirmed": self.tracks_confirmed,
+            "tracks_unknown": self.tracks_unknown,
+            "min_views": self.min_views,
+            "max_views": self.max_views,
+        }
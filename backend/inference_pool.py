@@ -0,0 +1,232 @@
+# backend/inference_pool.py (Process-Pool Inference Workers)
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from threading import Lock
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def configured_worker_count():
+    """INFERENCE_WORKERS: 0 (default) runs inference in the pipeline thread, "auto" uses one process per CPU."""
+    value = os.getenv("INFERENCE_WORKERS", "0").strip().lower()
+    if value == "auto":
+        return os.cpu_count() or 1
+    return max(0, int(value))
+
+
+def attach_shared_memory(name):
+    """Attaches to an existing block without letting this process's resource tracker unlink it on exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track flag; unregister manually so the owner stays in charge of the block
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+# --- Worker process side ---
+
+_worker_models = None
+# Mappings of the blocks that are still live, so each session's ring is attached once per worker
+_worker_attachments = {}
+
+
+def _init_worker(detector_backend, recognition_model):
+    """Loads and warms the models once per worker process."""
+    global _worker_models
+    from .model_registry import ModelRegistry
+    _worker_models = ModelRegistry(detector_backend, recognition_model)
+    _worker_models.initialize()
+
+
+def _close_retired_attachments(live):
+    """Unmaps every block the API process no longer uses, so the memory of ended sessions is freed."""
+    for name in [name for name in _worker_attachments if name not in live]:
+        try:
+            _worker_attachments.pop(name).close()
+        except BufferError:
+            # A view from an earlier task is still alive; the mapping goes away with it
+            pass
+
+
+def _frame_from_shared(ref, live):
+    name, shape, dtype, offset = ref
+    _close_retired_attachments(live)
+    shm = _worker_attachments.get(name)
+    if shm is None:
+        shm = attach_shared_memory(name)
+        _worker_attachments[name] = shm
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+
+
+def _detect_task(ref, live, max_side):
+    from .face_detection import detect_faces
+    return detect_faces(_frame_from_shared(ref, live), _worker_models.detector_backend, max_side)
+
+
+def _detect_tile_task(ref, live, tile, max_side):
+    from .face_detection import detect_faces_in_tile
+    return detect_faces_in_tile(_frame_from_shared(ref, live), tile, _worker_models.detector_backend, max_side)
+
+
+def _status_task():
+    return _worker_models.state
+
+
+def _embed_task(ref, live, boxes):
+    from .face_detection import crop_box
+    frame = _frame_from_shared(ref, live)
+    return _worker_models.get_embedder().embed([crop_box(frame, box) for box in boxes])
+
+
+# --- API process side ---
+
+class InferencePool:
+    """
+    Detection and embedding in separate worker processes, so inference for several
+    sessions runs on all cores and never holds the API process's GIL. Frame pixels stay
+    in the sessions' FrameRings; only a (name, shape, dtype, offset) reference is pickled.
+    """
+
+    def __init__(self, workers, detector_backend, recognition_model, max_restarts=None):
+        self.workers = workers
+        self._initargs = (detector_backend, recognition_model)
+        # A worker killed mid-task (e.g. out of memory) breaks the whole executor; it is
+        # replaced up to max_restarts times, after which the pool is given up on
+        self.max_restarts = max_restarts if max_restarts is not None else int(os.getenv("INFERENCE_MAX_RESTARTS", 3))
+        self.restarts = 0
+        self.last_error = None
+        self._executor_lock = Lock()
+        self._executor = self._start_executor()
+        self.tasks_submitted = 0
+        # Names of the shared-memory blocks sessions currently send frames from; every task
+        # carries them, so workers can unmap the blocks of rings that were closed
+        self._live_blocks = set()
+        self._live_lock = Lock()
+
+    def _start_executor(self):
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=self._initargs,
+        )
+        # Workers are spawned on demand; one task each starts them (and their model warm-up) now
+        for _ in range(self.workers):
+            executor.submit(_status_task)
+        return executor
+
+    @property
+    def available(self):
+        """False once the pool was given up on; callers then run inference in-process."""
+        return self._executor is not None
+
+    def _replace_broken(self, executor, error):
+        with self._executor_lock:
+            # Several sessions can see the same breakage; only the first replaces the executor
+            if executor is not self._executor:
+                return
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.last_error = str(error)
+            if self.restarts >= self.max_restarts:
+                self._executor = None
+                logger.error(f"Inference pool broke again ({error}); giving up after {self.restarts} restarts, inference runs in-process.")
+                return
+            self.restarts += 1
+            logger.error(f"Inference pool broke ({error}); starting new workers (restart {self.restarts}/{self.max_restarts}).")
+            self._executor = self._start_executor()
+
+    def _run(self, fn, calls):
+        """
+        Runs fn(*args) for every args in calls across the workers and returns the results in
+        order. Raises BrokenProcessPool if a worker died; the executor is replaced by then.
+        """
+        executor = self._executor
+        if executor is None:
+            raise BrokenProcessPool(f"Inference pool is unavailable: {self.last_error}")
+        self.tasks_submitted += len(calls)
+        try:
+            futures = [executor.submit(fn, *args) for args in calls]
+            return [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            self._replace_broken(executor, e)
+            raise
+
+    def _live(self, ref):
+        with self._live_lock:
+            self._live_blocks.add(ref[0])
+            return tuple(self._live_blocks)
+
+    def release_block(self, name):
+        """Called by the owner of a shared-memory block before closing it; workers unmap it on their next task."""
+        with self._live_lock:
+            self._live_blocks.discard(name)
+
+    def detect(self, ref, max_side=0):
+        return self._run(_detect_task, [(ref, self._live(ref), max_side)])[0]
+
+    def detect_regions(self, ref, regions, max_side=0):
+        """Detects inside every region in parallel across the workers. Returns the faces of all regions, unmerged."""
+        live = self._live(ref)
+        results = self._run(_detect_tile_task, [(ref, live, tuple(region), max_side) for region in regions])
+        return [det for detections in results for det in detections]
+
+    def detect_tiles(self, ref, frame_shape, tiling):
+        """Detects on every tile of the frame in parallel across the workers and merges the faces with NMS."""
+        from .face_detection import tile_grid, non_max_suppression
+        tiles = tile_grid(frame_shape, *tiling.grid, tiling.overlap)
+        return non_max_suppression(self.detect_regions(ref, tiles, tiling.max_side))
+
+    def embed(self, ref, boxes):
+        if not len(boxes):
+            return []
+        return self._run(_embed_task, [(ref, self._live(ref), [list(map(float, box[:4])) for box in boxes])])[0]
+
+    def status(self):
+        return {
+            "workers": self.workers,
+            "state": "running" if self.available else "broken",
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "tasks_submitted": self.tasks_submitted,
+        }
+
+    def shutdown(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_pool():
+    """Returns the shared InferencePool, starting it on first use, or None when INFERENCE_WORKERS is 0."""
+    global _pool
+    workers = configured_worker_count()
+    if workers == 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            from .model_registry import DETECTOR_BACKEND, RECOGNITION_MODEL
+            logger.info(f"Starting inference pool with {workers} worker processes...")
+            _pool = InferencePool(workers, DETECTOR_BACKEND, RECOGNITION_MODEL)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
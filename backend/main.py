@@ -1,9 +1,15 @@
 # backend/main.py (Corrected and Final)
 import os
-from fastapi import FastAPI
 from dotenv import load_dotenv
+# Before the package imports: model_registry and database_handler read their settings at import time
+load_dotenv()
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from . import database_handler
+from . import gallery_cache
+from . import model_registry
+from . import inference_pool
+from .session_manager import manager as session_manager
 
 # Import all route modules
 from .routes import attendance, registration, management, auth, principal, hod, staff, users
@@ -35,7 +41,34 @@ app.include_router(management.router, prefix="/api/management", tags=["General M
 app.include_router(users.router, prefix="/api/users", tags=["User Actions"])
 
 
+@app.on_event("startup")
+def load_student_gallery():
+    """Loads every student embedding once, so verification sessions start without touching the DB."""
+    gallery_cache.gallery.load()
+
+
+@app.on_event("startup")
+def load_face_models():
+    """Preloads and warms up the detector and recognition model (in the background by default)."""
+    background = os.getenv("MODEL_WARMUP_BACKGROUND", "true").lower() == "true"
+    model_registry.registry.initialize(background=background)
+    # Starts the worker processes (if INFERENCE_WORKERS is set) so they warm up before the first lecture
+    inference_pool.get_pool()
+
+
+@app.on_event("shutdown")
+def stop_verification_sessions():
+    """Stops every running verification pipeline so camera handles are released."""
+    session_manager.stop_all()
+    inference_pool.shutdown_pool()
+
+
 @app.get("/")
 def read_root():
-    """A simple health check endpoint."""
-    return {"status": "Backend is running."}
\ No newline at end of file
+    """A simple health check endpoint, including whether the face models are loaded."""
+    pool = inference_pool.get_pool()
+    return {
+        "status": "Backend is running.",
+        "models": model_registry.registry.status(),
+        "inference_pool": pool.status() if pool else None,
+    }
\ No newline at end of file
@@ -0,0 +1,92 @@
+# backend/model_registry.py (Preloaded Face Models)
+from dotenv import load_dotenv
+load_dotenv()
+import os
+import time
+import logging
+from threading import Event, Lock, Thread
+
+import numpy as np
+from deepface import DeepFace
+
+from .face_embedder import BatchEmbedder
+
+logger = logging.getLogger(__name__)
+
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "retinaface")
+RECOGNITION_MODEL = os.getenv("RECOGNITION_MODEL", "ArcFace")
+
+
+class ModelRegistry:
+    """
+    Loads the face detector and recognition model once per process and warms them up
+    with a dummy inference, so neither the first lecture frames nor the first
+    registration request pay the model loading cost. DeepFace caches built models
+    module-wide, so DeepFace.extract_faces / DeepFace.represent reuse them too.
+    """
+
+    def __init__(self, detector_backend=DETECTOR_BACKEND, recognition_model=RECOGNITION_MODEL):
+        self.detector_backend = detector_backend
+        self.recognition_model = recognition_model
+        self.embedder = BatchEmbedder(recognition_model)
+        self.state = "not_loaded"
+        self.error = None
+        self.load_seconds = None
+        self._ready = Event()
+        self._lock = Lock()
+
+    def initialize(self, background=False):
+        """Starts loading the models; in the background, the API can serve requests meanwhile."""
+        with self._lock:
+            if self.state in ("loading", "ready"):
+                return
+            self.state = "loading"
+        if background:
+            Thread(target=self._load, name="model-warmup", daemon=True).start()
+        else:
+            self._load()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            logger.info(f"Loading models: detector '{self.detector_backend}', recognition '{self.recognition_model}'...")
+            dummy_frame = np.zeros((480, 640, 3), dtype=np.uint8)
+            DeepFace.extract_faces(img_path=dummy_frame, detector_backend=self.detector_backend, enforce_detection=False)
+
+            dummy_face = np.zeros((112, 112, 3), dtype=np.uint8)
+            self.embedder.embed([dummy_face])
+            DeepFace.represent(
+                img_path=dummy_face, model_name=self.recognition_model,
+                enforce_detection=False, detector_backend='skip'
+            )
+            self.load_seconds = time.perf_counter() - started
+            self.state = "ready"
+            logger.info(f"Models ready in {self.load_seconds:.1f}s.")
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+            logger.error(f"FATAL: Failed to load face models: {e}", exc_info=True)
+        finally:
+            self._ready.set()
+
+    def wait_until_ready(self, timeout=None):
+        """Blocks until loading has finished (loading now if nobody started it). Returns True if the models are usable."""
+        if self.state == "not_loaded":
+            self.initialize()
+        self._ready.wait(timeout)
+        return self.state == "ready"
+
+    def get_embedder(self):
+        return self.embedder
+
+    def status(self):
+        return {
+            "state": self.state,
+            "detector": self.detector_backend,
+            "recognition_model": self.recognition_model,
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+registry = ModelRegistry()
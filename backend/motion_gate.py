@@ -0,0 +1,89 @@
+# backend/motion_gate.py (Motion-Gated Detection)
+import time
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MotionGate:
+    """
+    Cheap pre-stage that decides how much of a frame needs face detection.
+
+    Each frame is shrunk to a small grayscale image and diffed against the previous
+    checked frame. The difference is summed per cell of a grid, and check() returns:
+      - []       nothing moved; detection can be skipped and tracks carried forward,
+      - regions  a list of (x1, y1, x2, y2) boxes, in frame coordinates, around the cells
+                 that changed (padded by one cell), to detect in instead of the whole frame,
+      - None     run full-frame detection (first frame, large change, or periodic keyframe
+                 so faces that appeared without moving are still picked up).
+    """
+
+    def __init__(self, grid=(4, 4), width=160, pixel_threshold=15, min_changed_fraction=0.01,
+                 full_frame_fraction=0.5, keyframe_interval=5.0, clock=time.monotonic):
+        self.grid = grid
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        # Share of a cell's pixels that must change for the cell to count as moving
+        self.min_changed_fraction = min_changed_fraction
+        # Above this share of moving cells, one full-frame pass is cheaper than many regions
+        self.full_frame_fraction = full_frame_fraction
+        self.keyframe_interval = keyframe_interval
+        # Seconds source for keyframes; offline processing passes the video's own time
+        self.clock = clock
+        self._previous = None
+        self._last_keyframe = 0.0
+        self.frames_static = 0
+        self.frames_regional = 0
+        self.frames_full = 0
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, round(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def check(self, frame):
+        gray = self._small_gray(frame)
+        previous, self._previous = self._previous, gray
+        now = self.clock()
+        if previous is None or previous.shape != gray.shape or now - self._last_keyframe >= self.keyframe_interval:
+            self._last_keyframe = now
+            self.frames_full += 1
+            return None
+
+        changed = (cv2.absdiff(gray, previous) > self.pixel_threshold).astype(np.int32)
+        rows, cols = self.grid
+        ys = np.linspace(0, gray.shape[0], rows + 1).astype(int)
+        xs = np.linspace(0, gray.shape[1], cols + 1).astype(int)
+        changed_per_cell = np.add.reduceat(np.add.reduceat(changed, ys[:-1], axis=0), xs[:-1], axis=1)
+        cell_pixels = np.maximum(np.outer(np.diff(ys), np.diff(xs)), 1)
+        moving = changed_per_cell / cell_pixels >= self.min_changed_fraction
+
+        if not moving.any():
+            self.frames_static += 1
+            return []
+        if moving.mean() >= self.full_frame_fraction:
+            self.frames_full += 1
+            return None
+
+        # Grow each moving cell by one cell so faces cut by a cell border are whole, then group neighbours
+        grown = cv2.dilate(moving.astype(np.uint8), np.ones((3, 3), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(grown, connectivity=8)
+        h, w = frame.shape[:2]
+        cell_h, cell_w = h / rows, w / cols
+        regions = []
+        for x, y, bw, bh, _ in stats[1:count]:
+            regions.append((int(x * cell_w), int(y * cell_h), int(min(w, (x + bw) * cell_w)), int(min(h, (y + bh) * cell_h))))
+        self.frames_regional += 1
+        return regions
+
+    def get_stats(self):
+        return {
+            "frames_static": self.frames_static,
+            "frames_regional": self.frames_regional,
+            "frames_full": self.frames_full,
+        }
@@ -0,0 +1,216 @@
+# backend/offline_processor.py (Recorded-Lecture Batch Processing)
+# Usage: python -m backend.offline_processor <video> --lecture '{"class": "TYCO", "subject": "DBMS", ...}'
+#        --recorded-at "2026-10-12 10:00:00" [--workers N] [--chunk-seconds 120] [--sample-fps 2] [--dry-run]
+from dotenv import load_dotenv
+load_dotenv()
+import os
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from threading import Event
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+def plan_chunks(frame_count, fps, chunk_seconds):
+    """Splits a video into [start_frame, end_frame) time chunks of chunk_seconds each."""
+    chunk_frames = max(1, int(round(chunk_seconds * fps)))
+    return [(start, min(start + chunk_frames, frame_count)) for start in range(0, frame_count, chunk_frames)]
+
+
+# --- Worker process side ---
+
+class _VideoClock:
+    """Seconds into the video of the frame being analyzed, used in place of time.monotonic()."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _init_worker():
+    """Loads the models once per worker process; the gallery is memory-mapped from the shared snapshot."""
+    from .model_registry import registry
+    from .gallery_cache import gallery
+    registry.initialize()
+    gallery.ensure_loaded()
+
+
+def _process_chunk(video_path, start_frame, end_frame, fps, sample_fps, lecture):
+    """
+    Decodes one time chunk and runs the verification pipeline on sample_fps frames per
+    second of video. Frames in between are only grabbed, not converted. Returns the
+    students confirmed in the chunk with the video time they were first confirmed at.
+    """
+    from .pipeline import VerificationPipeline
+    from .model_registry import registry
+
+    started = time.perf_counter()
+    if not registry.wait_until_ready():
+        raise RuntimeError(f"Face models are not available in offline worker: {registry.error}")
+    # Motion keyframes and the crop cache's TTL follow video time, since chunks run faster than real time
+    clock = _VideoClock(start_frame / fps)
+    pipeline = VerificationPipeline(
+        Event(), lecture, video_source=video_path, record_attendance=False, use_inference_pool=False, clock=clock
+    )
+    if not pipeline.is_initialized:
+        raise RuntimeError("Failed to initialize verification pipeline in offline worker.")
+    capture = cv2.VideoCapture(video_path)
+    capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    step = max(1, int(round(fps / sample_fps))) if sample_fps else 1
+    confirmed = {}
+    frames_decoded = 0
+    try:
+        for index in range(start_frame, end_frame):
+            if not capture.grab():
+                break
+            frames_decoded += 1
+            if (index - start_frame) % step:
+                continue
+            ret, frame = capture.retrieve()
+            if not ret:
+                continue
+            clock.now = index / fps
+            pipeline.analyze(frame)
+            for roll_no, info in pipeline.confirmed_attendance.items():
+                if roll_no not in confirmed:
+                    confirmed[roll_no] = {"name": info["name"], "offset_seconds": index / fps}
+            # Nothing left to find in this chunk once the whole class is confirmed
+            if pipeline.expected_students and pipeline.expected_students.issubset(confirmed):
+                break
+    finally:
+        capture.release()
+
+    return {
+        "start_frame": start_frame,
+        "end_frame": end_frame,
+        "confirmed": confirmed,
+        "frames_decoded": frames_decoded,
+        "frames_analyzed": pipeline.frames_inferred,
+        "faces_embedded": pipeline.faces_embedded,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+# --- Coordinator side ---
+
+def merge_chunk_results(chunk_results):
+    """Unions the students confirmed in every chunk, keeping the earliest time each one was seen."""
+    merged = {}
+    for result in chunk_results:
+        for roll_no, info in result["confirmed"].items():
+            previous = merged.get(roll_no)
+            if previous is None or info["offset_seconds"] < previous["offset_seconds"]:
+                merged[roll_no] = {**info, "chunks": previous["chunks"] + 1 if previous else 1}
+            else:
+                previous["chunks"] += 1
+    return merged
+
+
+def _parse_recorded_at(lecture, recorded_at):
+    value = recorded_at or lecture.get("recorded_at") or lecture.get("date")
+    return datetime.fromisoformat(value) if value else None
+
+
+def process_recording(video_path, lecture, recorded_at=None, workers=None, chunk_seconds=None, sample_fps=None, record=True):
+    """
+    Computes attendance for a recorded lecture. The video is split into time chunks that
+    run in parallel in a spawn process pool; the per-chunk confirmations are merged and,
+    with record=True, written through database_handler with the lecture's metadata,
+    dated to when the lecture was recorded (recorded_at, or the lecture's "recorded_at"
+    or "date"). Recording requires that date, so a lecture processed days later is never
+    filed under today. Returns the merged attendance and a throughput report.
+    """
+    from . import database_handler
+    from .gallery_cache import gallery
+
+    lecture = lecture or {}
+    recording_start = _parse_recorded_at(lecture, recorded_at)
+    if record and recording_start is None:
+        raise ValueError("A recording date is required to record attendance: pass recorded_at or set the lecture's 'recorded_at' or 'date'.")
+    workers = workers or int(os.getenv("OFFLINE_WORKERS", 0)) or os.cpu_count() or 1
+    chunk_seconds = chunk_seconds or float(os.getenv("OFFLINE_CHUNK_SECONDS", 120))
+    sample_fps = sample_fps if sample_fps is not None else float(os.getenv("OFFLINE_SAMPLE_FPS", 2))
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video file: '{video_path}'.")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    if frame_count <= 0:
+        raise ValueError(f"Video file has no frames: '{video_path}'.")
+    video_seconds = frame_count / fps
+
+    # Make sure the gallery snapshot exists before the workers memory-map it
+    gallery.ensure_loaded()
+
+    chunks = plan_chunks(frame_count, fps, chunk_seconds)
+    workers = min(workers, len(chunks))
+    logger.info(f"Processing {video_seconds / 60:.1f} min of '{video_path}' in {len(chunks)} chunks on {workers} workers...")
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker) as executor:
+        futures = [executor.submit(_process_chunk, video_path, start, end, fps, sample_fps, lecture) for start, end in chunks]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            logger.info(f"Chunk {result['start_frame'] / fps:.0f}-{result['end_frame'] / fps:.0f}s done: {len(result['confirmed'])} students.")
+    wall_seconds = time.perf_counter() - started
+
+    attendance = merge_chunk_results(results)
+    for roll_no, info in attendance.items():
+        seen_at = recording_start + timedelta(seconds=info["offset_seconds"]) if recording_start else None
+        info["timestamp"] = seen_at.strftime('%Y-%m-%d %H:%M:%S') if seen_at else None
+        if record:
+            database_handler.record_attendance(
+                roll_no, info["name"], lecture,
+                attendance_date=seen_at.date().isoformat(), timestamp=info["timestamp"]
+            )
+
+    frames_decoded = sum(r["frames_decoded"] for r in results)
+    report = {
+        "video_seconds": round(video_seconds, 1),
+        "wall_seconds": round(wall_seconds, 1),
+        "realtime_factor": round(video_seconds / wall_seconds, 1) if wall_seconds else None,
+        "workers": workers,
+        "chunks": len(chunks),
+        "frames_decoded": frames_decoded,
+        "decode_fps": round(frames_decoded / wall_seconds, 1) if wall_seconds else None,
+        "frames_analyzed": sum(r["frames_analyzed"] for r in results),
+        "faces_embedded": sum(r["faces_embedded"] for r in results),
+        "students_confirmed": len(attendance),
+        "recorded": record,
+    }
+    logger.info(f"Offline processing finished: {report}")
+    return {"attendance": attendance, "report": report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute attendance from a recorded lecture video.")
+    parser.add_argument("video", help="Recorded lecture video file")
+    parser.add_argument("--lecture", default="{}", help="Lecture metadata as JSON (class, subject, teacher, hall, time)")
+    parser.add_argument("--recorded-at", help="When the recording started, e.g. 2026-10-12 10:00:00 (required unless --dry-run or the lecture has a date)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: OFFLINE_WORKERS or one per CPU)")
+    parser.add_argument("--chunk-seconds", type=float, help="Length of each time chunk (default 120)")
+    parser.add_argument("--sample-fps", type=float, help="Frames analyzed per second of video (default 2)")
+    parser.add_argument("--dry-run", action="store_true", help="Report attendance without writing it to the database")
+    args = parser.parse_args()
+
+    output = process_recording(
+        args.video, json.loads(args.lecture), recorded_at=args.recorded_at, workers=args.workers,
+        chunk_seconds=args.chunk_seconds, sample_fps=args.sample_fps, record=not args.dry_run
+    )
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    main()
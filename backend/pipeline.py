@@ -1,48 +1,86 @@
-# backend/pipeline.py (Final Version with Correct Tracker Formatting)
+# backend/pipeline.py (Final Version with Built-in Face Tracker)
 from dotenv import load_dotenv
 load_dotenv()
 import cv2
-import torch
 import numpy as np
 import logging
 import time
 import os
+from functools import partial
 from threading import Event
+from concurrent.futures.process import BrokenProcessPool
 import backend.database_handler as database_handler
-from scipy.spatial.distance import cosine
-from deepface import DeepFace
-# from bytetracker import BYTETracker  # Temporarily disabled due to lap compilation issues
+from backend import gallery_cache
+from backend import model_registry
+from backend import inference_pool
+from backend.face_detection import (
+    detect_faces, detect_faces_tiled, detect_faces_in_regions, non_max_suppression, crop_box, tiling_from_config
+)
+from backend.frame_source import LatestFrameCapture
+from backend.frame_ring import FrameRing, FrameRef
+from backend.frame_scheduler import AdaptiveFrameScheduler
+from backend.face_tracker import FaceTracker
+from backend.motion_gate import MotionGate
+from backend.face_quality import FaceQualityGate
+from backend.identity_voting import IdentityVoter, TrackIdentity
+from backend.embedding_cache import CropEmbeddingCache
 
 log_format = '%(asctime)s - %(levelname)s - [%(module)s:%(lineno)d] - %(message)s'
 logging.basicConfig(level=logging.INFO, format=log_format, filename='logs/app.log', filemode='a')
 logger = logging.getLogger(__name__)
 
 class VerificationPipeline:
-    def __init__(self, stop_event: Event, current_lecture: dict = None):
+    def __init__(self, stop_event: Event, current_lecture: dict = None, video_source: str = None, detection_tiling=None,
+                 record_attendance=True, use_inference_pool=True, has_viewers=None, event_sink=None, clock=None):
         self.is_initialized = False
         try:
-            self.video_source = os.getenv("VIDEO_SOURCE", "0")
-            self.recognition_model = os.getenv("RECOGNITION_MODEL", "ArcFace")
+            self.video_source = str(video_source) if video_source is not None else os.getenv("VIDEO_SOURCE", "0")
+            # Models are loaded once per process by the registry and shared by every pipeline
+            self.models = model_registry.registry
+            self.recognition_model = self.models.recognition_model
+            self.detector_backend = self.models.detector_backend
             self.recognition_threshold = float(os.getenv("RECOGNITION_THRESHOLD", 0.4))
+            # Longest frame side the detector sees (0 = native resolution); crops still come from the full frame
+            self.detection_max_side = int(os.getenv("DETECTION_MAX_SIDE", 640))
+            # Tiled detection for high-resolution halls: the hall's own setting, else DETECTION_TILE_GRID (e.g. "2x3")
+            self.detection_tiling = tiling_from_config(
+                detection_tiling or {"grid": os.getenv("DETECTION_TILE_GRID", "1x1"), "overlap": os.getenv("DETECTION_TILE_OVERLAP", 0.2)},
+                max_side=self.detection_max_side
+            )
+            if self.detection_tiling:
+                logger.info(f"Tiled detection enabled: {self.detection_tiling}")
+            # Seconds source for the motion gate's keyframes and the crop cache's TTL; recorded
+            # lectures pass the video's timestamps so they behave as they would live
+            self.clock = clock or time.monotonic
+            # Frame differencing skips detection on static frames and limits it to the regions that changed
+            self.motion_gate = None
+            if os.getenv("MOTION_GATE", "true").lower() == "true":
+                self.motion_gate = MotionGate(
+                    grid=tuple(int(v) for v in os.getenv("MOTION_GATE_GRID", "4x4").lower().split("x")),
+                    pixel_threshold=int(os.getenv("MOTION_PIXEL_THRESHOLD", 15)),
+                    min_changed_fraction=float(os.getenv("MOTION_MIN_CHANGED_FRACTION", 0.01)),
+                    keyframe_interval=float(os.getenv("MOTION_KEYFRAME_SECONDS", 5)),
+                    clock=self.clock
+                )
             self.frame_skip = int(os.getenv("FRAME_SKIP", 5))
+            target_fps = os.getenv("TARGET_PROCESSED_FPS")
+            # FRAME_SKIP is only the starting point; the scheduler retunes it from measured latency
+            self.scheduler = AdaptiveFrameScheduler(
+                initial_skip=self.frame_skip,
+                min_skip=int(os.getenv("FRAME_SKIP_MIN", 1)),
+                max_skip=int(os.getenv("FRAME_SKIP_MAX", 30)),
+                cpu_budget=float(os.getenv("PROCESSING_BUDGET", 0.5)),
+                target_fps=float(target_fps) if target_fps else None,
+                idle_skip=int(os.getenv("IDLE_FRAME_SKIP", 60)),
+                adaptive=os.getenv("ADAPTIVE_FRAME_SKIP", "true").lower() == "true"
+            )
             self.current_lecture = current_lecture if current_lecture else {}
             
-            logger.info("Using RetinaFace for detection and ArcFace for recognition.")
-            logger.info("Loading student database...")
+            # GALLERY_SCOPE=class matches only against the lecture's class; "institute" matches everyone
+            self.gallery_scope = os.getenv("GALLERY_SCOPE", "class").lower()
+            self.cross_class_lookup = os.getenv("CROSS_CLASS_LOOKUP", "false").lower() == "true"
             
-            # Load student database - revert to original approach for accuracy
-            logger.info("Loading all student database for face recognition...")
-            self.student_db = database_handler.get_all_student_data()
-            logger.info(f"Loaded {len(self.student_db)} total students for face recognition")
-            
-            # Validate student database for debugging
-            valid_students = 0
-            for roll_no, data in self.student_db.items():
-                if "arcface_embedding" in data and data["arcface_embedding"] is not None:
-                    valid_students += 1
-                else:
-                    logger.warning(f"Student {roll_no} has missing or invalid embedding")
-            logger.info(f"Valid embeddings: {valid_students}/{len(self.student_db)}")
+            logger.info(f"Using {self.detector_backend} for detection and {self.recognition_model} for recognition.")
             
             # If class info is available, log it for filtering attendance records later
             if current_lecture and current_lecture.get('class'):
@@ -53,11 +91,85 @@ class VerificationPipeline:
                 logger.warning("No class information provided in lecture")
                 self.target_class = None
             
-            # self.tracker = BYTETracker(frame_rate=30)  # Temporarily disabled
-            self.tracker = None  # Placeholder until tracker is fixed
+            # Students come from the app-wide gallery cache, which is already in memory
+            gallery = gallery_cache.gallery
+            gallery.refresh_if_stale()
+            if self._is_class_scoped():
+                self.student_db = gallery.get_student_db(self.target_class)
+                self.matcher = gallery.get_matcher(self.target_class)
+                logger.info(f"Using {len(self.student_db)} students of class {self.target_class} for face recognition")
+            else:
+                self.student_db = gallery.get_student_db()
+                self.matcher = gallery.get_matcher()
+                logger.info(f"Using {len(self.student_db)} total students for face recognition")
+            
+            # The gallery matrix is prebuilt (students without an embedding are left out of it)
+            logger.info(f"Valid embeddings: {len(self.matcher)}/{len(self.student_db)}")
+            
+            # In-memory roll_no -> class map, so matches never need a DB round trip
+            self.student_classes = gallery.get_class_map()
+            
+            # Once all of these are confirmed the scheduler drops to its idle cadence
+            self.expected_students = {
+                roll_no for roll_no in self.student_db
+                if self.target_class and self.student_classes.get(roll_no) == self.target_class and roll_no in self.matcher
+            }
+            
+            # Institute-wide index, built only on the first unmatched face when CROSS_CLASS_LOOKUP is on
+            self._institute_db = None
+            self._institute_matcher = None
+            
+            self.embedder = self.models.get_embedder()
+            # With INFERENCE_WORKERS set, detection and embedding run in the shared worker processes
+            self.inference_pool = inference_pool.get_pool() if use_inference_pool else None
+            # Offline chunk workers collect confirmations and leave writing attendance to the caller
+            self.record_attendance = record_attendance
+            # Callable telling whether anyone watches the stream; without viewers the pipeline runs headless
+            self.has_viewers = has_viewers or (lambda: True)
+            # Callable(event_type, data) that receives attendance events as they happen
+            self.event_sink = event_sink
+            
+            self.tracker = FaceTracker(
+                iou_threshold=float(os.getenv("TRACKER_IOU_THRESHOLD", 0.3)),
+                max_missed=int(os.getenv("TRACKER_MAX_MISSED", 10))
+            )
+            # Each track is embedded a bounded number of times and confirmed by a vote over several views
+            self.voter = IdentityVoter(
+                self.recognition_threshold,
+                min_views=int(os.getenv("IDENTITY_MIN_VIEWS", 2)),
+                max_views=int(os.getenv("IDENTITY_MAX_VIEWS", 6)),
+                reembed_interval=int(os.getenv("REEMBED_INTERVAL", 10)),
+                quality_gain=float(os.getenv("REEMBED_QUALITY_GAIN", 0.15))
+            )
+            # Near-identical crops at the same spot reuse their earlier embedding and match
+            self.embedding_cache = None
+            if os.getenv("EMBEDDING_CACHE", "true").lower() == "true":
+                self.embedding_cache = CropEmbeddingCache(
+                    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", 512)),
+                    ttl=float(os.getenv("EMBEDDING_CACHE_TTL", 10)),
+                    max_hamming=int(os.getenv("EMBEDDING_CACHE_MAX_HAMMING", 6)),
+                    clock=self.clock
+                )
+            # Faces that are too small, blurred or turned are not embedded; their track is retried on later frames
+            self.quality_gate = None
+            if os.getenv("QUALITY_GATE", "true").lower() == "true":
+                self.quality_gate = FaceQualityGate(
+                    min_size=int(os.getenv("FACE_MIN_SIZE", 40)),
+                    min_confidence=float(os.getenv("FACE_MIN_CONFIDENCE", 0.5)),
+                    min_sharpness=float(os.getenv("FACE_MIN_SHARPNESS", 30)),
+                    max_yaw=float(os.getenv("FACE_MAX_YAW", 0.3))
+                )
             self.stop_event = stop_event
             self.confirmed_attendance = {}
             self.tracks = {}
+            self.capture = None
+            # Annotated frames are drawn into preallocated ring slots, created on the first processed frame
+            self.annotation_ring = None
+            self.frame_count = 0
+            self.frames_inferred = 0
+            self.faces_embedded = 0
+            self.frames_annotated = 0
+            self.faces_seen = 0
             self.is_initialized = True
             logger.info("Verification pipeline initialized successfully.")
         except Exception as e:
@@ -65,118 +177,354 @@ class VerificationPipeline:
             self.is_initialized = False
 
     def _get_embedding_from_crop(self, face_crop):
-        try:
-            embedding_objs = DeepFace.represent(
-                img_path=face_crop, model_name=self.recognition_model, 
-                enforce_detection=False, detector_backend='skip'
-            )
-            return embedding_objs[0]["embedding"] if embedding_objs else None
-        except Exception:
-            return None
+        return self._get_embeddings_from_crops([face_crop])[0]
+
+    def _get_embeddings_from_crops(self, face_crops):
+        """Embeds every crop of a frame in one model invocation. Returns None for crops that failed."""
+        return self.embedder.embed(face_crops)
 
     def _match_embedding_to_db(self, embedding):
-        min_dist, matched_roll_no = float('inf'), "Unknown"
-        second_min_dist = float('inf')
+        return self._match_embeddings_to_db([embedding])[0]
+
+    def _match_embeddings_to_db(self, embeddings):
+        """Matches a batch of embeddings against the gallery and returns one roll_no (or "Unknown") per embedding."""
+        return [
+            result.roll_no if result.roll_no is not None and result.distance < self.recognition_threshold else "Unknown"
+            for result in self._match_results(embeddings)
+        ]
+
+    def _match_results(self, embeddings):
+        """Matches a batch of embeddings against the gallery and returns one MatchResult per embedding."""
+        results = self.matcher.match(embeddings)
+        unmatched = []
+        for i, result in enumerate(results):
+            # Log matching details for debugging
+            if result.roll_no is not None and result.distance < self.recognition_threshold:
+                student_name = self.student_db.get(result.roll_no, {}).get("name", "Unknown")
+                logger.info(f"Face matched: {student_name} ({result.roll_no}) - Distance: {result.distance:.3f}, Confidence Gap: {result.confidence_gap:.3f}")
+            else:
+                logger.debug(f"No match found - Minimum distance: {result.distance:.3f} (threshold: {self.recognition_threshold})")
+                unmatched.append(i)
         
-        for roll_no, data in self.student_db.items():
-            dist = cosine(embedding, data["arcface_embedding"])
-            if dist < min_dist:
-                second_min_dist = min_dist
-                min_dist, matched_roll_no = dist, roll_no
-            elif dist < second_min_dist:
-                second_min_dist = dist
+        if unmatched and self._is_class_scoped() and self.cross_class_lookup:
+            self._report_out_of_class_faces([embeddings[i] for i in unmatched])
+        return results
+
+    def _is_class_scoped(self):
+        return bool(self.target_class) and self.gallery_scope == "class"
+
+    def _report_out_of_class_faces(self, embeddings):
+        """Looks up faces unknown to the class gallery in the institute-wide index. Only logs; never records attendance."""
+        if self._institute_matcher is None:
+            self._institute_db = gallery_cache.gallery.get_student_db()
+            self._institute_matcher = gallery_cache.gallery.get_matcher()
+            logger.info(f"Built institute-wide index with {len(self._institute_matcher)} students for cross-class lookup")
         
-        # Log matching details for debugging
-        if min_dist < self.recognition_threshold:
-            confidence_gap = second_min_dist - min_dist
-            student_name = self.student_db.get(matched_roll_no, {}).get("name", "Unknown")
-            logger.info(f"Face matched: {student_name} ({matched_roll_no}) - Distance: {min_dist:.3f}, Confidence Gap: {confidence_gap:.3f}")
-            return matched_roll_no
-        else:
-            logger.debug(f"No match found - Minimum distance: {min_dist:.3f} (threshold: {self.recognition_threshold})")
-            return "Unknown"
+        for result in self._institute_matcher.match(embeddings):
+            if result.roll_no is None or result.distance >= self.recognition_threshold:
+                continue
+            student_class = self.student_classes.get(result.roll_no)
+            if student_class == self.target_class:
+                continue
+            student_name = self._institute_db.get(result.roll_no, {}).get("name", "Unknown")
+            logger.warning(f"Out-of-class face: {student_name} ({result.roll_no}) of class {student_class} seen during {self.target_class} lecture - Distance: {result.distance:.3f}")
 
     def run(self):
         if not self.is_initialized: return
+        if not self.models.wait_until_ready():
+            logger.error(f"FATAL: Face models are not available: {self.models.error}")
+            return
         
-        source_to_open = int(self.video_source) if self.video_source.isdigit() else self.video_source
-        video_capture = cv2.VideoCapture(source_to_open)
-        if not video_capture.isOpened():
+        # Frames only need shared memory when worker processes read them
+        use_pool = self.inference_pool is not None and self.inference_pool.available
+        self.capture = LatestFrameCapture(self.video_source, shared=use_pool)
+        if not self.capture.start():
             logger.error(f"FATAL: Cannot open video source: '{self.video_source}'.")
             return
 
-        frame_count = 0
-        while not self.stop_event.is_set():
-            ret, frame = video_capture.read()
-            if not ret: break
-            
-            frame_count += 1
-            if frame_count % self.frame_skip != 0:
-                yield frame
+        try:
+            while not self.stop_event.is_set():
+                seq, frame = self.capture.read(timeout=1.0)
+                if frame is None:
+                    if self.capture.ended: break
+                    continue
+                
+                # The frame stays pinned in the capture ring only while it is being used here
+                output = None
+                try:
+                    self.frame_count += 1
+                    # Headless while nobody watches: no copy, no drawing and nothing handed to the stream
+                    watched = self.has_viewers()
+                    if not self.scheduler.should_process():
+                        if watched:
+                            output = FrameRef(self.capture.ring, seq)
+                    else:
+                        started = time.perf_counter()
+                        output = self._process_frame(frame, seq, annotate=watched)
+                        self.scheduler.record_latency(time.perf_counter() - started, self.capture.capture_fps)
+                finally:
+                    self.capture.release(seq)
+                if output is not None:
+                    yield output
+        finally:
+            if self.inference_pool is not None and self.capture.ring is not None and self.capture.ring.shared:
+                self.inference_pool.release_block(self.capture.ring.name)
+            self.capture.close()
+            if self.annotation_ring is not None:
+                self.annotation_ring.close()
+            logger.info(f"Video capture stopped: {self.capture.get_stats()}")
+
+    def analyze(self, frame):
+        """
+        Runs detection, tracking and recognition on one frame outside run(), e.g. for
+        recorded lectures, without annotating it. Returns the online tracks.
+        """
+        self.frame_count += 1
+        return self._analyze_frame(frame, None)
+
+    def _process_frame(self, frame, seq, annotate=True):
+        """
+        Runs detection, tracking, embedding and matching on one frame and returns a
+        FrameRef to its annotated copy, or None with annotate=False. Worker processes
+        read the frame straight from the capture ring, so it is never copied or pickled.
+        """
+        # Without a usable pool (none configured, or given up on after crashes) inference runs in this thread
+        use_pool = self.capture.ring.shared and self.inference_pool is not None and self.inference_pool.available
+        frame_ref = self.capture.ring.ref(seq) if use_pool else None
+        online_targets = self._analyze_frame(frame, frame_ref)
+        if not annotate:
+            return None
+        return self._annotate(frame, seq, online_targets)
+
+    def _annotate(self, frame, seq, online_targets):
+        """Draws the tracks into the next annotation slot. Falls back to the raw frame if every slot is being streamed."""
+        if self.annotation_ring is None:
+            # Only the in-process stream encoder reads annotated frames, so no shared memory is needed
+            self.annotation_ring = FrameRing(frame.shape, slots=3, dtype=frame.dtype, shared=False)
+        slot, annotated_frame = self.annotation_ring.begin_write()
+        if slot is None:
+            return FrameRef(self.capture.ring, seq)
+        np.copyto(annotated_frame, frame)
+        self.frames_annotated += 1
+        for t in online_targets:
+            x1, y1, x2, y2, track_id = map(int, t[:5])
+            identity = self.tracks.get(track_id)
+            if identity is None or identity.views == 0:
                 continue
+            name = self.student_db.get(identity.roll_no, {}).get("name", "Unknown")
+            if identity.status == "pending":
+                # Orange with a question mark while the vote is still open
+                color, name = (0, 165, 255), f"{name}?"
+            else:
+                color = (0, 255, 0) if identity.roll_no != "Unknown" else (0, 0, 255)
+            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(annotated_frame, name, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+        return FrameRef(self.annotation_ring, self.annotation_ring.commit(slot))
 
-            annotated_frame = frame.copy()
-            online_targets = []
-            
+    def _in_pool(self, pool_call, local_call):
+        """Runs pool_call in the inference workers; if a worker died, runs local_call in this thread instead."""
+        try:
+            return pool_call()
+        except BrokenProcessPool as e:
+            logger.warning(f"Inference pool failed ({e}); running this frame in-process.")
+            return local_call()
+
+    def _detect_faces(self, frame, frame_ref, regions=None):
+        if regions is not None:
+            return self._detect_faces_in_regions(frame, frame_ref, regions)
+        if self.detection_tiling:
+            local = partial(detect_faces_tiled, frame, self.detection_tiling, self.detector_backend)
+            if frame_ref is not None:
+                return self._in_pool(partial(self.inference_pool.detect_tiles, frame_ref, frame.shape, self.detection_tiling), local)
+            return local()
+        local = partial(detect_faces, frame, self.detector_backend, self.detection_max_side)
+        if frame_ref is not None:
+            return self._in_pool(partial(self.inference_pool.detect, frame_ref, self.detection_max_side), local)
+        return local()
+
+    def _detect_faces_in_regions(self, frame, frame_ref, regions):
+        """Detects only inside the regions the motion gate flagged; tracks outside them are carried forward unchanged."""
+        max_side = self.detection_tiling.max_side if self.detection_tiling else self.detection_max_side
+        local = partial(detect_faces_in_regions, frame, regions, self.detector_backend, max_side)
+        if frame_ref is not None:
+            detections = self._in_pool(partial(self.inference_pool.detect_regions, frame_ref, regions, max_side), local)
+        else:
+            detections = local()
+        detections = non_max_suppression(detections)
+        for x1, y1, x2, y2, _, conf in self.tracker.current():
+            if not any(x1 < rx2 and rx1 < x2 and y1 < ry2 and ry1 < y2 for rx1, ry1, rx2, ry2 in regions):
+                detections.append([x1, y1, x2, y2, conf])
+        return detections
+
+    def _embed_boxes(self, frame, frame_ref, boxes):
+        """Embeds the faces inside the given boxes in one batch. Returns None for boxes that failed."""
+        if frame_ref is not None:
+            return self._in_pool(partial(self.inference_pool.embed, frame_ref, boxes), partial(self._embed_boxes, frame, None, boxes))
+        return self._get_embeddings_from_crops([crop_box(frame, box) for box in boxes])
+
+    def _analyze_frame(self, frame, frame_ref):
+        """Detects, tracks, embeds and matches the faces of one frame. Returns the online tracks."""
+        frame_count = self.frame_count
+        self.frames_inferred += 1
+        online_targets = []
+        detections_for_tracker = []
+        
+        try:
+            regions = self.motion_gate.check(frame) if self.motion_gate else None
+            if regions is not None and not regions:
+                # Nothing moved since the last processed frame: keep every track where it was
+                return self.tracker.current()
+            detections_for_tracker = self._detect_faces(frame, frame_ref, regions)
+
+            # The tracker must see empty frames too, so stale tracks can expire
+            online_targets = self.tracker.update(detections_for_tracker)
+            for track_id in self.tracker.removed_ids:
+                self.tracks.pop(track_id, None)
+        except Exception as e:
+            logger.warning(f"Face detection/tracking failed for frame {frame_count}: {e}")
+
+        # Embed the tracks that still need a view in one batch, then score them against the gallery in one batch
+        embed_ids, embed_boxes, embed_quality = [], [], []
+        for t in online_targets:
+            track_id = int(t[4])
+            identity = self.tracks.get(track_id)
+            if identity is None:
+                identity = self.tracks[track_id] = TrackIdentity()
+                self.faces_seen += 1
+            if identity.status != "pending" or track_id in embed_ids:
+                continue
+            quality = self._track_quality(frame, t, detections_for_tracker) if self.quality_gate is not None else None
+            if quality is not None and quality.reason:
+                # Not embedded; the track is queued again on the next processed frame
+                continue
+            score = quality.score if quality is not None else None
+            if not self.voter.wants_embedding(identity, self.frames_inferred, score):
+                continue
+            embed_ids.append(track_id)
+            embed_boxes.append(t[:4])
+            embed_quality.append(score)
+
+        if embed_boxes:
             try:
-                detected_faces = DeepFace.extract_faces(
-                    img_path=frame, detector_backend='retinaface', enforce_detection=False
-                )
-                
-                detections_for_tracker = []
-                for face_obj in detected_faces:
-                    fa = face_obj['facial_area']
-                    x, y, w, h = fa['x'], fa['y'], fa['w'], fa['h']
-                    confidence = face_obj['confidence']
-                    # --- THIS IS THE CRITICAL FIX ---
-                    # Add a dummy class ID of 0 for BYTETracker compatibility
-                    detections_for_tracker.append([x, y, x + w, y + h, confidence, 0])
-
-                if detections_for_tracker and self.tracker is not None:
-                    online_targets = self.tracker.update(torch.tensor(detections_for_tracker), [frame.shape[0], frame.shape[1]])
-                else:
-                    online_targets = []  # No tracking for now
+                self._embed_tracks(frame, frame_ref, embed_ids, embed_boxes, embed_quality)
             except Exception as e:
-                logger.warning(f"Face detection/tracking failed for frame {frame_count}: {e}")
+                # The tracks stay pending and are tried again on a later frame
+                logger.warning(f"Face embedding failed for frame {frame_count}: {e}")
 
-            for t in online_targets:
-                x1, y1, x2, y2, track_id = map(int, t[:5])
-                
-                if track_id not in self.tracks:
-                    face_crop = frame[y1:y2, x1:x2]
-                    embedding = self._get_embedding_from_crop(face_crop)
-                    
-                    if embedding is not None:
-                        roll_no = self._match_embedding_to_db(embedding)
-                        student_info = self.student_db.get(roll_no, {})
-                        student_name = student_info.get("name", "Unknown")
-                        self.tracks[track_id] = {"name": student_name, "roll_no": roll_no}
-                        
-                        if roll_no != "Unknown" and roll_no not in self.confirmed_attendance:
-                            # Check if student belongs to the target class (if specified)
-                            should_record = True
-                            if self.target_class:
-                                student_class = database_handler.get_student_class(roll_no)
-                                if student_class != self.target_class:
-                                    logger.info(f"Student {student_name} ({roll_no}) detected but belongs to {student_class}, not {self.target_class}. Skipping attendance.")
-                                    should_record = False
-                            
-                            if should_record:
-                                self.confirmed_attendance[roll_no] = {"name": student_name, "timestamp": time.strftime('%Y-%m-%d %H:%M:%S')}
-                                database_handler.record_attendance(roll_no, student_name, self.current_lecture)
-                                logger.info(f"Recorded attendance for {student_name} ({roll_no}) in class {self.target_class or 'Any'}")
-                    else:
-                        self.tracks[track_id] = {"name": "Unknown", "roll_no": "Unknown"}
-                
-                track_info = self.tracks.get(track_id)
-                if track_info:
-                    color = (0, 255, 0) if track_info["roll_no"] != "Unknown" else (0, 0, 255)
-                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-                    cv2.putText(annotated_frame, track_info["name"], (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+        return online_targets
+
+    def _embed_tracks(self, frame, frame_ref, track_ids, boxes, quality_scores):
+        """
+        Adds a view to each track. A near-identical cached crop stands in for the embedding
+        call, but only with an embedding the track has not voted with yet; anything else is
+        embedded in one batch, so repeated views of a still face are real new embeddings.
+        """
+        cached = [
+            self.embedding_cache.lookup(frame, box, exclude=self.tracks[track_id].embedding_ids)
+            if self.embedding_cache else (None, None)
+            for track_id, box in zip(track_ids, boxes)
+        ]
+        misses = []
+        for i, (hit, key) in enumerate(cached):
+            if hit is None:
+                misses.append(i)
+            else:
+                self._add_track_view(track_ids[i], hit.result, quality_scores[i], hit.embedding_id)
+        if not misses:
+            return
+
+        self.faces_embedded += len(misses)
+        embeddings = self._embed_boxes(frame, frame_ref, [boxes[i] for i in misses])
+        embedded = [i for i, emb in zip(misses, embeddings) if emb is not None]
+        valid_embeddings = [emb for emb in embeddings if emb is not None]
+        for i, emb in zip(misses, embeddings):
+            if emb is None:
+                self.voter.mark_attempt(self.tracks[track_ids[i]], self.frames_inferred)
+        if valid_embeddings:
+            for i, embedding, result in zip(embedded, valid_embeddings, self._match_results(valid_embeddings)):
+                embedding_id = self.embedding_cache.put(cached[i][1], embedding, result) if self.embedding_cache is not None else None
+                self._add_track_view(track_ids[i], result, quality_scores[i], embedding_id)
+
+    def _add_track_view(self, track_id, result, quality_score, embedding_id=None):
+        identity = self.tracks[track_id]
+        if embedding_id is not None:
+            identity.embedding_ids.add(embedding_id)
+        if self.voter.add_view(identity, result, self.frames_inferred, quality_score):
+            self._assign_track(track_id, identity.roll_no)
+
+    def _track_quality(self, frame, target, detections):
+        """Scores a track's face in this frame, using its detection (with landmarks, if any) when it has one."""
+        det_index = self.tracker.last_matches.get(int(target[4]))
+        detection = detections[det_index] if det_index is not None else [*target[:4], target[5]]
+        return self.quality_gate.assess(frame, detection)
+
+    def _assign_track(self, track_id, roll_no):
+        """Called once a track's identity is confirmed by the vote; records attendance for it."""
+        student_info = self.student_db.get(roll_no, {})
+        student_name = student_info.get("name", "Unknown")
+        
+        if roll_no != "Unknown" and roll_no not in self.confirmed_attendance:
+            # Check if student belongs to the target class (if specified)
+            should_record = True
+            if self.target_class:
+                student_class = self.student_classes.get(roll_no)
+                if student_class != self.target_class:
+                    logger.info(f"Student {student_name} ({roll_no}) detected but belongs to {student_class}, not {self.target_class}. Skipping attendance.")
+                    should_record = False
             
-            yield annotated_frame
+            if should_record:
+                self.confirmed_attendance[roll_no] = {"name": student_name, "timestamp": time.strftime('%Y-%m-%d %H:%M:%S')}
+                self._emit("attendance", {"roll_no": roll_no, **self.confirmed_attendance[roll_no]})
+                if not self.record_attendance:
+                    return
+                database_handler.record_attendance(roll_no, student_name, self.current_lecture)
+                logger.info(f"Recorded attendance for {student_name} ({roll_no}) in class {self.target_class or 'Any'}")
+                if self.expected_students and self.expected_students.issubset(self.confirmed_attendance):
+                    logger.info(f"All {len(self.expected_students)} students of {self.target_class} confirmed.")
+                    self.scheduler.set_idle(True)
+                    self._emit("class_complete", {"class": self.target_class, "confirmed": len(self.confirmed_attendance)})
 
-        video_capture.release()
+    def _emit(self, event_type, data):
+        if self.event_sink is None:
+            return
+        try:
+            self.event_sink(event_type, data)
+        except Exception as e:
+            logger.warning(f"Failed to publish {event_type} event: {e}")
 
     def get_attendance(self):
-        return self.confirmed_attendance
\ No newline at end of file
+        """A copy of the confirmed students, safe to serialize while the pipeline thread adds to it."""
+        return dict(self.confirmed_attendance)
+
+    def get_counters(self):
+        """Small live counters for the session event stream."""
+        return {
+            "frames_processed": self.frames_inferred,
+            "faces_seen": self.faces_seen,
+            "active_tracks": len(self.tracks),
+            "unknowns": self.voter.tracks_unknown,
+            "confirmed": len(self.confirmed_attendance),
+            "expected": len(self.expected_students) if self.expected_students else None,
+        }
+
+    def get_stats(self):
+        """Frame counters for monitoring how far behind real time inference is."""
+        stats = {
+            "frames_received": self.frame_count,
+            "frames_inferred": self.frames_inferred,
+            "faces_embedded": self.faces_embedded,
+            "frames_annotated": self.frames_annotated,
+            "headless": not self.has_viewers(),
+            "active_tracks": len(self.tracks),
+            "scheduler": self.scheduler.get_stats(),
+        }
+        if self.motion_gate is not None:
+            stats["motion_gate"] = self.motion_gate.get_stats()
+        if self.quality_gate is not None:
+            stats["quality_gate"] = self.quality_gate.get_stats()
+        stats["identity"] = self.voter.get_stats()
+        if self.embedding_cache is not None:
+            stats["embedding_cache"] = self.embedding_cache.get_stats()
+        if self.capture is not None:
+            stats["capture"] = self.capture.get_stats()
+        return stats
\ No newline at end of file
@@ -0,0 +1,129 @@
+# backend/pipeline_benchmark.py (Offline Pipeline Benchmark)
+# Usage: python -m backend.pipeline_benchmark <video-or-image> [--frames 50] [--sizes 1280,960,640,480] [--json]
+from dotenv import load_dotenv
+load_dotenv()
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from backend.face_detection import detect_faces, crop_box
+from backend.face_matcher import normalize_rows
+from backend.face_tracker import iou_matrix
+from backend.model_registry import ModelRegistry, DETECTOR_BACKEND, RECOGNITION_MODEL
+
+
+def sample_frames(source, count):
+    """Reads up to count frames spread evenly over a video (or a single image)."""
+    image = cv2.imread(source)
+    if image is not None:
+        return [image]
+    capture = cv2.VideoCapture(source)
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    step = max(1, total // count)
+    frames = []
+    for index in range(0, total, step):
+        capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+        if len(frames) >= count:
+            break
+    capture.release()
+    return frames
+
+
+def _embed(embedder, frame, detections):
+    return embedder.embed([crop_box(frame, det) for det in detections]) if detections else []
+
+
+def benchmark_detection_sizes(frames, sizes, models, iou_threshold=0.5):
+    """
+    Runs detection and embedding at every detection size and compares each one with
+    native resolution (size 0): detection recall of the native faces, and the cosine
+    similarity between embeddings of matching faces (crops always come from the full frame).
+    """
+    embedder = models.get_embedder()
+    results = {}
+    reference = {}
+    for max_side in [0] + [s for s in sizes if s != 0]:
+        detect_time = embed_time = 0.0
+        faces = matched = reference_faces = 0
+        similarities = []
+        for index, frame in enumerate(frames):
+            started = time.perf_counter()
+            detections = detect_faces(frame, models.detector_backend, max_side)
+            detect_time += time.perf_counter() - started
+            started = time.perf_counter()
+            embeddings = _embed(embedder, frame, detections)
+            embed_time += time.perf_counter() - started
+            faces += len(detections)
+
+            if max_side == 0:
+                reference[index] = (detections, embeddings)
+                continue
+            ref_detections, ref_embeddings = reference[index]
+            reference_faces += len(ref_detections)
+            if not detections or not ref_detections:
+                continue
+            iou = iou_matrix(np.asarray([d[:4] for d in ref_detections]), np.asarray([d[:4] for d in detections]))
+            for ref_i, det_i in enumerate(iou.argmax(axis=1)):
+                if iou[ref_i, det_i] < iou_threshold:
+                    continue
+                matched += 1
+                a, b = ref_embeddings[ref_i], embeddings[det_i]
+                if a is not None and b is not None:
+                    pair = normalize_rows(np.stack([a, b]))
+                    similarities.append(float(pair[0] @ pair[1]))
+
+        n = max(len(frames), 1)
+        results[max_side or "native"] = {
+            "detect_ms": round(1000 * detect_time / n, 1),
+            "embed_ms": round(1000 * embed_time / n, 1),
+            "faces_per_frame": round(faces / n, 2),
+            "recall_vs_native": round(matched / reference_faces, 3) if max_side and reference_faces else None,
+            "embedding_similarity_vs_native": round(float(np.mean(similarities)), 4) if similarities else None,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the verification pipeline on a recorded video.")
+    parser.add_argument("source", help="Video file or image")
+    parser.add_argument("--frames", type=int, default=50, help="Number of frames to sample")
+    parser.add_argument("--sizes", default="1280,960,640,480", help="Comma-separated detection max sides to compare with native resolution")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON instead of a table")
+    args = parser.parse_args()
+
+    frames = sample_frames(args.source, args.frames)
+    if not frames:
+        parser.error(f"Cannot read frames from '{args.source}'.")
+    models = ModelRegistry(DETECTOR_BACKEND, RECOGNITION_MODEL)
+    models.initialize()
+    if not models.wait_until_ready():
+        raise SystemExit(f"Face models are not available: {models.error}")
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = {
+        "source": args.source,
+        "frames": len(frames),
+        "resolution": list(frames[0].shape[:2]),
+        "detection_sizes": benchmark_detection_sizes(frames, sizes, models),
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{results['source']}: {results['frames']} frames at {frames[0].shape[1]}x{frames[0].shape[0]}")
+    print(f"{'max side':>9} {'detect ms':>10} {'embed ms':>9} {'faces':>6} {'recall':>7} {'emb sim':>8}")
+    for size, row in results["detection_sizes"].items():
+        print(f"{size:>9} {row['detect_ms']:>10} {row['embed_ms']:>9} {row['faces_per_frame']:>6} "
+              f"{row['recall_vs_native'] if row['recall_vs_native'] is not None else '-':>7} "
+              f"{row['embedding_similarity_vs_native'] if row['embedding_similarity_vs_native'] is not None else '-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,8 @@ def register_students_v5():
     cursor.execute('''
         CREATE TABLE students (
             roll_no TEXT PRIMARY KEY, name TEXT NOT NULL,
-            student_class TEXT NOT NULL, arcface_embedding BLOB NOT NULL
+            student_class TEXT NOT NULL, arcface_embedding BLOB NOT NULL,
+            embedding_dim INTEGER, embedding_model TEXT
         )''')
     conn.commit()
     conn.close()
@@ -48,8 +49,9 @@ def register_students_v5():
             master_embedding = np.mean(embeddings, axis=0)
             conn = database_handler.sqlite3.connect(database_handler.DB_FILE)
             cursor = conn.cursor()
-            cursor.execute("INSERT INTO students (roll_no, name, student_class, arcface_embedding) VALUES (?, ?, ?, ?)",
-                           (roll_no, name, class_for_batch, database_handler.pickle.dumps(master_embedding)))
+            embedding_blob, embedding_dim = database_handler.serialize_embedding(master_embedding)
+            cursor.execute("INSERT INTO students (roll_no, name, student_class, arcface_embedding, embedding_dim, embedding_model) VALUES (?, ?, ?, ?, ?, ?)",
+                           (roll_no, name, class_for_batch, embedding_blob, embedding_dim, "ArcFace"))
             conn.commit()
             conn.close()
             print(f"-> Saved master embedding for {name}.")
@@ -1,111 +1,167 @@
-# backend/routes/attendance.py (Final Hardened Version)
-import cv2
+# backend/routes/attendance.py (Multi-Session Version)
+import os
+import time
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
-from threading import Thread, Event
 from pydantic import BaseModel
 from typing import Optional
-import queue # Use the correct import
-import time
 
-from ..pipeline import VerificationPipeline
+from ..session_manager import manager
+from ..session_events import sse_message
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-pipeline_thread = None
-pipeline_instance = None
-stop_event = None
-frame_queue = None
 
 class StartRequest(BaseModel):
     current_lecture: Optional[dict] = None
 
-def run_pipeline_in_background():
-    """Target function that runs the pipeline and puts frames into a queue."""
-    global frame_queue
-    try:
-        if pipeline_instance and pipeline_instance.is_initialized:
-            for frame in pipeline_instance.run():
-                if stop_event and stop_event.is_set():
-                    break
-                if frame_queue.full():
-                    try:
-                        frame_queue.get_nowait()
-                    except queue.Empty:
-                        pass
-                frame_queue.put(frame)
-        else:
-            logger.error("Pipeline instance not initialized, thread cannot run.")
-    except Exception as e:
-        logger.error(f"Pipeline crashed: {e}", exc_info=True)
+
+def _get_session_or_404(session_id: Optional[str]):
+    """Looks up a session; session_id may be omitted while exactly one session is running."""
+    session = manager.get(session_id)
+    if not session:
+        detail = "Verification session not found." if session_id else "Verification is not running, or several sessions are running and no session_id was given."
+        raise HTTPException(status_code=404, detail=detail)
+    return session
 
 
 @router.post("/start_verification")
 async def start_verification(request: StartRequest):
-    global pipeline_thread, pipeline_instance, stop_event, frame_queue
-    if pipeline_thread and pipeline_thread.is_alive():
-        raise HTTPException(status_code=400, detail="Verification is already running.")
-    
     logger.info("Starting verification process...")
-    stop_event = Event()
-    frame_queue = queue.Queue(maxsize=2)
-    pipeline_instance = VerificationPipeline(stop_event, request.current_lecture)
-    
-    if not pipeline_instance.is_initialized:
-        raise HTTPException(status_code=500, detail="Failed to initialize verification pipeline. Check backend logs for model/video path errors.")
+    try:
+        # Building a pipeline can reload the gallery; keep it off the event loop that serves the streams
+        session = await run_in_threadpool(manager.start_session, request.current_lecture)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    pipeline_thread = Thread(target=run_pipeline_in_background, daemon=True)
-    pipeline_thread.start()
-    
-    return {"status": "Verification started successfully."}
+    return {"status": "Verification started successfully.", "session_id": session.session_id, "hall": session.hall}
 
 
 @router.post("/stop_verification")
-async def stop_verification():
-    global pipeline_thread, stop_event, pipeline_instance
-    if not stop_event:
+async def stop_verification(session_id: Optional[str] = None):
+    # Stopping joins the pipeline, capture and encoder threads, which takes seconds
+    session = await run_in_threadpool(manager.stop_session, session_id)
+    if not session:
         raise HTTPException(status_code=400, detail="Verification is not running.")
-    
-    logger.info("Stopping verification process...")
-    stop_event.set()
-    if pipeline_thread:
-        pipeline_thread.join(timeout=5)
-    
-    pipeline_instance = None
-    return {"status": "Verification stopped."}
+    return {"status": "Verification stopped.", "session_id": session.session_id}
+
+
+@router.get("/sessions")
+async def list_sessions():
+    """Lists every verification session on this server."""
+    return manager.list_sessions()
 
 
 @router.get("/get_attendance")
-async def get_attendance():
-    if not pipeline_instance:
+async def get_attendance(session_id: Optional[str] = None):
+    session = manager.get(session_id)
+    if not session:
         return {}
-    return pipeline_instance.get_attendance()
+    return session.pipeline.get_attendance()
 
 
-def stream_generator():
-    """Yields frames from the shared queue."""
-    if not frame_queue:
-        logger.warning("Stream requested but frame queue is not available.")
-        return
+@router.get("/stats")
+async def get_pipeline_stats(session_id: Optional[str] = None):
+    """Frame counters (read, dropped, inferred) of a running pipeline and its stream."""
+    session = manager.get(session_id)
+    if not session:
+        return {}
+    return {**session.pipeline.get_stats(), "stream": session.broadcaster.get_stats()}
+
+
+async def stream_generator(session, request: Request, max_width=None, quality=None, max_fps=None):
+    """
+    Yields the session's MJPEG parts. Runs on the event loop: it awaits the broadcaster's
+    new-frame notification (encoding happens once per width/quality tier, on the
+    broadcaster's thread) and stops as soon as the client disconnects. With max_fps the
+    client sleeps between frames and then picks up the newest one.
+    """
+    broadcaster, stop_event = session.broadcaster, session.stop_event
+    min_interval = 1.0 / max_fps if max_fps else 0.0
     
-    logger.info("Stream generator attached to frame queue.")
-    while not stop_event or not stop_event.is_set():
-        try:
-            frame = frame_queue.get(timeout=1.0)
-            (flag, encodedImage) = cv2.imencode(".jpg", frame)
-            if not flag: continue
-            yield (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + 
-                   bytearray(encodedImage) + b'\r\n')
-        except queue.Empty:
-            if stop_event and stop_event.is_set():
-                break
-            continue
-    logger.info("Stream generator has detached.")
+    logger.info(f"Stream generator attached to session {session.session_id}.")
+    try:
+        async with broadcaster.subscribe_async(max_width, quality, max_fps) as subscription:
+            while not stop_event.is_set():
+                part = await broadcaster.wait_for_frame_async(subscription, timeout=1.0)
+                if part is None:
+                    if not session.is_running or await request.is_disconnected():
+                        break
+                    continue
+                sent_at = time.monotonic()
+                yield part
+                if min_interval:
+                    await asyncio.sleep(max(0.0, min_interval - (time.monotonic() - sent_at)))
+    finally:
+        # Also reached when Starlette cancels the response because the client went away
+        logger.info(f"Stream generator has detached from session {session.session_id}.")
 
 
 @router.get("/stream")
-async def video_stream():
-    """Returns the streaming response."""
-    return StreamingResponse(stream_generator(), media_type="multipart/x-mixed-replace; boundary=frame")
\ No newline at end of file
+async def video_stream(
+    request: Request,
+    session_id: Optional[str] = None,
+    max_width: Optional[int] = Query(None, ge=1, description="Downscale frames to at most this width"),
+    fps: Optional[float] = Query(None, gt=0, description="Maximum frames per second for this viewer"),
+    quality: Optional[int] = Query(None, ge=1, le=100, description="JPEG quality"),
+):
+    """Returns the streaming response. Viewers asking for the same width and quality share one encode."""
+    session = _get_session_or_404(session_id)
+    return StreamingResponse(
+        stream_generator(session, request, max_width=max_width, quality=quality, max_fps=fps),
+        media_type="multipart/x-mixed-replace; boundary=frame"
+    )
+
+
+async def event_generator(session, request: Request, last_event_id=None):
+    """
+    Server-Sent Events for one session: a snapshot of the confirmed students on connect
+    (or a replay of missed events when reconnecting with Last-Event-ID), an "attendance"
+    event as soon as a student is confirmed, and "counters" every EVENT_COUNTERS_INTERVAL
+    seconds, which also serve as keep-alives.
+    """
+    events, stop_event = session.events, session.stop_event
+    interval = float(os.getenv("EVENT_COUNTERS_INTERVAL", 2))
+    
+    logger.info(f"Event stream attached to session {session.session_id}.")
+    try:
+        async with events.subscribe() as waiter:
+            if last_event_id is None:
+                last_id = events.last_id
+                yield sse_message("snapshot", session.pipeline.get_attendance(), event_id=last_id)
+            else:
+                last_id = last_event_id
+            next_counters = 0.0
+            while not stop_event.is_set():
+                for event_id, event_type, data in events.events_since(last_id):
+                    last_id = event_id
+                    yield sse_message(event_type, data, event_id=event_id)
+                if time.monotonic() >= next_counters:
+                    yield sse_message("counters", session.pipeline.get_counters())
+                    next_counters = time.monotonic() + interval
+                if not session.is_running:
+                    break
+                if not await events.wait(waiter, last_id, timeout=max(0.05, next_counters - time.monotonic())):
+                    if await request.is_disconnected():
+                        break
+            yield sse_message("end", session.pipeline.get_counters())
+    finally:
+        logger.info(f"Event stream has detached from session {session.session_id}.")
+
+
+@router.get("/events")
+async def session_events(request: Request, session_id: Optional[str] = None):
+    """Pushes attendance confirmations and live counters of a session as Server-Sent Events, replacing get_attendance polling."""
+    session = _get_session_or_404(session_id)
+    last_event_id = request.headers.get("last-event-id")
+    return StreamingResponse(
+        event_generator(session, request, int(last_event_id) if last_event_id and last_event_id.isdigit() else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -4,15 +4,19 @@ import cv2
 import numpy as np
 import logging
 from fastapi import APIRouter, HTTPException, File, UploadFile, Form, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List
 
 from .. import database_handler
 from .. import auth
+from .. import model_registry
 from deepface import DeepFace
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 PHOTOS_BASE_FOLDER = os.path.join(PROJECT_ROOT, "data", "registration_photos")
+# How long a registration request waits for the face models before answering 503
+MODEL_WAIT_SECONDS = float(os.getenv("REGISTRATION_MODEL_WAIT_SECONDS", 10))
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
@@ -24,12 +28,28 @@ class BatchRegistrationRequest(BaseModel):
     clear_existing_students: bool = False
 
 
-# --- Internal Processing Function ---
+# --- Internal Processing Functions ---
+async def _require_models():
+    """
+    Returns the model registry once it is ready, or raises 503. Waited for on a threadpool
+    thread, so warm-up never stalls the event loop (streams, SSE, health checks).
+    """
+    models = model_registry.registry
+    if not await run_in_threadpool(models.wait_until_ready, MODEL_WAIT_SECONDS):
+        if models.state == "failed":
+            raise HTTPException(status_code=503, detail="Face models failed to load. Check backend logs.")
+        raise HTTPException(status_code=503, detail="Face models are still loading. Try again shortly.", headers={"Retry-After": "10"})
+    return models
+
 def _process_batch_registration(student_class: str, department: str, clear_db: bool):
     """Processes folders and registers students with the given department."""
     if not os.path.isdir(PHOTOS_BASE_FOLDER):
         raise FileNotFoundError(f"Registration folder not found at '{PHOTOS_BASE_FOLDER}'")
 
+    models = model_registry.registry
+    if not models.wait_until_ready(MODEL_WAIT_SECONDS):
+        raise RuntimeError(f"Face models are not available: {models.error}")
+
     if clear_db:
         database_handler.recreate_students_table()
 
@@ -54,7 +74,7 @@ def _process_batch_registration(student_class: str, department: str, clear_db: b
             try:
                 embedding_obj = DeepFace.represent(
                     img_path=os.path.join(PHOTOS_BASE_FOLDER, folder_name, photo), 
-                    model_name="ArcFace", enforce_detection=True, detector_backend='retinaface'
+                    model_name=models.recognition_model, enforce_detection=True, detector_backend=models.detector_backend
                 )
                 embeddings.append(embedding_obj[0]["embedding"])
             except Exception as e:
@@ -65,15 +85,24 @@ def _process_batch_registration(student_class: str, department: str, clear_db: b
             database_handler.add_student(
                 roll_no, name, student_class, master_embedding, 
                 parent_phone_number=parent_phone, 
-                department=department
+                department=department, embedding_model=models.recognition_model
             )
             registered_students.append({"roll_no": roll_no, "name": name})
         else:
             failed_folders.append(folder_name)
 
+    _refresh_gallery_snapshot()
     return registered_students, failed_folders
 
 
+def _refresh_gallery_snapshot():
+    """Re-exports the shared gallery snapshot so other worker processes pick up new registrations."""
+    try:
+        database_handler.export_gallery_snapshot()
+    except Exception as e:
+        logger.error(f"Failed to export gallery snapshot after registration: {e}", exc_info=True)
+
+
 # --- API Endpoints ---
 
 @router.post("/run_batch_registration")
@@ -86,8 +115,11 @@ async def run_batch_registration_endpoint(
     Runs batch registration for students from photo folders on the server.
     THIS ENDPOINT IS CURRENTLY NOT SECURED.
     """
+    await _require_models()
     try:
-        registered, failed = _process_batch_registration(
+        # Embedding every photo folder is blocking work; keep it off the event loop
+        registered, failed = await run_in_threadpool(
+            _process_batch_registration,
             request.student_class, 
             request.department,
             request.clear_existing_students
@@ -114,13 +146,15 @@ async def register_single_student(
     if not user_dept:
         raise HTTPException(status_code=403, detail="Registering user is not assigned to a department.")
 
+    models = await _require_models()
+
     embeddings = []
     for photo in photos:
         try:
             contents = await photo.read()
             nparr = np.frombuffer(contents, np.uint8)
             img_np = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            embedding_obj = DeepFace.represent(img_path=img_np, model_name="ArcFace", enforce_detection=True, detector_backend='retinaface')
+            embedding_obj = DeepFace.represent(img_path=img_np, model_name=models.recognition_model, enforce_detection=True, detector_backend=models.detector_backend)
             embeddings.append(embedding_obj[0]["embedding"])
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Could not process image: {photo.filename}. Is it a clear face?")
@@ -130,8 +164,9 @@ async def register_single_student(
         database_handler.add_student(
             roll_no=roll_no, name=name, student_class=student_class,
             embedding=master_embedding, parent_phone_number=parent_phone,
-            department=user_dept
+            department=user_dept, embedding_model=models.recognition_model
         )
+        _refresh_gallery_snapshot()
         return {"status": "success", "message": f"Student {name} registered in {user_dept} department."}
     else:
         raise HTTPException(status_code=400, detail="Could not generate embeddings.")
\ No newline at end of file
@@ -0,0 +1,81 @@
+# backend/session_events.py (Per-Session Event Stream)
+import json
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from threading import Lock
+
+from .stream_broadcaster import AsyncWaiter
+
+logger = logging.getLogger(__name__)
+
+
+def sse_message(event_type, data, event_id=None):
+    """Formats one Server-Sent Events message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data)}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class SessionEventBus:
+    """
+    Numbered events of one verification session (e.g. a student confirmed), published
+    from the pipeline thread and awaited by any number of asyncio subscribers.
+
+    The last `history` events are kept, so a client that reconnects with Last-Event-ID
+    gets what it missed.
+    """
+
+    def __init__(self, history=1024):
+        self._lock = Lock()
+        self._events = deque(maxlen=history)
+        self._waiters = set()
+        self._closed = False
+        self.last_id = 0
+
+    def publish(self, event_type, data):
+        with self._lock:
+            self.last_id += 1
+            self._events.append((self.last_id, event_type, data))
+            for waiter in self._waiters:
+                waiter.notify()
+
+    def events_since(self, last_id):
+        """Returns the (id, type, data) events newer than last_id that are still in the history."""
+        with self._lock:
+            return [event for event in self._events if event[0] > last_id]
+
+    @asynccontextmanager
+    async def subscribe(self):
+        waiter = AsyncWaiter(asyncio.get_running_loop())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            yield waiter
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    async def wait(self, waiter, last_id, timeout):
+        """Waits until an event newer than last_id is published. Returns False on timeout or after close()."""
+        with self._lock:
+            if self.last_id > last_id:
+                return True
+            if self._closed:
+                return False
+            waiter.event.clear()
+        try:
+            await asyncio.wait_for(waiter.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self.last_id > last_id
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for waiter in self._waiters:
+                waiter.notify()
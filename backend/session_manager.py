@@ -0,0 +1,166 @@
+# backend/session_manager.py (Concurrent Verification Sessions)
+import os
+import json
+import time
+import uuid
+import logging
+from threading import Thread, Event, Lock
+
+from .pipeline import VerificationPipeline
+from .stream_broadcaster import StreamBroadcaster
+from .session_events import SessionEventBus
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HALL = "default"
+
+
+def _load_hall_setting(env_var):
+    """
+    Reads a per-hall JSON map from the environment:
+    HALL_VIDEO_SOURCES, e.g. {"Hall 1": "rtsp://..."} (VIDEO_SOURCE is the fallback), and
+    HALL_DETECTION_TILES, e.g. {"Hall 1": {"grid": "2x3", "overlap": 0.2}} (DETECTION_TILE_GRID is the fallback).
+    """
+    try:
+        return json.loads(os.getenv(env_var, "{}"))
+    except json.JSONDecodeError:
+        logger.error(f"{env_var} is not valid JSON; using the default for every hall.")
+        return {}
+
+
+class VerificationSession:
+    """
+    One running pipeline (one hall / camera) with its own thread, stop event and stream
+    broadcaster. The broadcaster receives FrameRefs into the pipeline's shared-memory
+    rings, not pixels, and encodes them once for every viewer. Attendance events go to
+    the session's event bus for /events subscribers.
+    """
+
+    def __init__(self, session_id, hall, current_lecture, video_source=None, detection_tiling=None):
+        self.session_id = session_id
+        self.hall = hall
+        self.current_lecture = current_lecture or {}
+        self.started_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.stop_event = Event()
+        self.broadcaster = StreamBroadcaster(session_id)
+        self.events = SessionEventBus()
+        # Model weights and the student gallery are process-wide, so each session only adds its own state.
+        # The pipeline only annotates frames while the stream has viewers.
+        self.pipeline = VerificationPipeline(
+            self.stop_event, self.current_lecture, video_source=video_source, detection_tiling=detection_tiling,
+            has_viewers=lambda: self.broadcaster.subscribers > 0, event_sink=self.events.publish
+        )
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(target=self._run, name=f"pipeline-{self.session_id[:8]}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        """Target function that runs the pipeline and hands its frame references to the broadcaster."""
+        try:
+            for frame_ref in self.pipeline.run():
+                if self.stop_event.is_set():
+                    break
+                self.broadcaster.publish(frame_ref)
+        except Exception as e:
+            logger.error(f"Pipeline for session {self.session_id} crashed: {e}", exc_info=True)
+        finally:
+            self.broadcaster.close()
+            self.events.close()
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def info(self):
+        return {
+            "session_id": self.session_id,
+            "hall": self.hall,
+            "class": self.current_lecture.get("class"),
+            "subject": self.current_lecture.get("subject"),
+            "started_at": self.started_at,
+            "running": self.is_running,
+            "confirmed": len(self.pipeline.get_attendance()),
+            "viewers": self.broadcaster.subscribers,
+            "stream_kbps": self.broadcaster.get_stats()["bandwidth_kbps"],
+        }
+
+
+class SessionManager:
+    """Runs independent verification pipelines side by side, one per hall, keyed by session ID."""
+
+    def __init__(self, max_sessions=None):
+        self.max_sessions = max_sessions or int(os.getenv("MAX_VERIFICATION_SESSIONS", 10))
+        self.hall_video_sources = _load_hall_setting("HALL_VIDEO_SOURCES")
+        self.hall_detection_tiles = _load_hall_setting("HALL_DETECTION_TILES")
+        self._sessions = {}
+        self._lock = Lock()
+
+    def start_session(self, current_lecture=None):
+        """Starts a pipeline for the lecture's hall. Raises ValueError if the hall is busy or the server is full."""
+        current_lecture = current_lecture or {}
+        hall = current_lecture.get("hall") or DEFAULT_HALL
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if session.hall == hall:
+                    if session.is_running:
+                        raise ValueError(f"Verification is already running in {hall} (session {session_id}).")
+                    # A finished session for this hall is replaced by the new one
+                    del self._sessions[session_id]
+            running = sum(1 for s in self._sessions.values() if s.is_running)
+            if running >= self.max_sessions:
+                raise ValueError(f"Maximum of {self.max_sessions} concurrent verification sessions reached.")
+
+            session = VerificationSession(
+                uuid.uuid4().hex, hall, current_lecture,
+                video_source=self.hall_video_sources.get(hall),
+                detection_tiling=self.hall_detection_tiles.get(hall)
+            )
+            if not session.pipeline.is_initialized:
+                session.broadcaster.close()
+                raise RuntimeError("Failed to initialize verification pipeline. Check backend logs for model/video path errors.")
+            self._sessions[session.session_id] = session
+        session.start()
+        logger.info(f"Started verification session {session.session_id} in {hall}.")
+        return session
+
+    def get(self, session_id=None):
+        """Returns the session by ID; without an ID, the only session if exactly one exists. None otherwise."""
+        with self._lock:
+            if session_id:
+                return self._sessions.get(session_id)
+            if len(self._sessions) == 1:
+                return next(iter(self._sessions.values()))
+            return None
+
+    def stop_session(self, session_id=None):
+        """Stops and forgets a session. Returns the stopped session, or None if it does not exist."""
+        session = self.get(session_id)
+        if session is None:
+            return None
+        logger.info(f"Stopping verification session {session.session_id} in {session.hall}...")
+        session.stop()
+        with self._lock:
+            self._sessions.pop(session.session_id, None)
+        return session
+
+    def list_sessions(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return [session.info() for session in sessions]
+
+    def stop_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.stop()
+
+
+manager = SessionManager()
@@ -0,0 +1,259 @@
+# backend/stream_broadcaster.py (Single-Encode MJPEG Broadcaster)
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from threading import Condition, Thread
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Requested widths are rounded down to this step so viewers share tiers
+WIDTH_STEP = 160
+QUALITY_STEP = 5
+# Window over which the outgoing bandwidth is measured
+BANDWIDTH_WINDOW = 5.0
+
+
+def mjpeg_part(jpeg_bytes):
+    """Wraps one JPEG image as a multipart/x-mixed-replace part."""
+    return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg_bytes + b'\r\n'
+
+
+def tier_key(max_width=None, quality=None, default_quality=95):
+    """Snaps a viewer's requested max width and JPEG quality to a shared (width, quality) tier; width 0 is full size."""
+    width = (int(max_width) // WIDTH_STEP) * WIDTH_STEP if max_width else 0
+    if max_width and width == 0:
+        width = WIDTH_STEP
+    quality = int(quality or default_quality)
+    quality = min(95, max(QUALITY_STEP, (quality // QUALITY_STEP) * QUALITY_STEP))
+    return width, quality
+
+
+class _Tier:
+    """The newest encoded part for one (width, quality) pair, shared by every viewer on it."""
+
+    def __init__(self, key):
+        self.key = key
+        self.part = None
+        self.part_seq = 0
+        self.subscribers = 0
+        # Viewers currently waiting for a newer part; the tier is only encoded while there are some
+        self.waiting = 0
+        self.frames_encoded = 0
+        self.bytes_encoded = 0
+
+
+class AsyncWaiter:
+    """Wakes one asyncio subscriber from another thread (the encoder, or the pipeline for events)."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def notify(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            # The subscriber's event loop is already closed
+            pass
+
+
+class Subscription:
+    """One viewer: its tier, its asyncio waiter and its frame-rate cap."""
+
+    def __init__(self, tier, max_fps=None, waiter=None):
+        self.tier = tier
+        self.max_fps = max_fps
+        self.waiter = waiter
+        self.last_seq = 0
+        self.frames_sent = 0
+
+
+class StreamBroadcaster:
+    """
+    Fans one session's annotated frames out to any number of MJPEG viewers.
+
+    The pipeline publishes FrameRefs; an encoder thread encodes only the newest one, once
+    per (width, quality) tier that has a waiting viewer, and every viewer on a tier reads
+    the same bytes. Each viewer just waits for a newer part than the one it sent last,
+    so a slow client (or one capped to a low frame rate) skips frames instead of holding
+    up the others or the pipeline. Nothing is encoded while nobody is subscribed.
+
+    Viewers are asyncio tasks (subscribe_async / wait_for_frame_async) woken through
+    their event loop, so waiting for a frame never blocks a threadpool worker.
+    """
+
+    def __init__(self, name, jpeg_quality=None):
+        self.name = name
+        self.jpeg_quality = jpeg_quality or int(os.getenv("STREAM_JPEG_QUALITY", 95))
+        self._cond = Condition()
+        self._pending = None
+        self._tiers = {}
+        self._subscribers = 0
+        self._waiters = set()
+        self._closed = False
+        self._sent = deque()
+        self.frames_published = 0
+        self.frames_superseded = 0
+        self.bytes_sent = 0
+        self._thread = Thread(target=self._encoder, name=f"stream-{name[:8]}", daemon=True)
+        self._thread.start()
+
+    @property
+    def subscribers(self):
+        return self._subscribers
+
+    def publish(self, frame_ref):
+        """Offers the newest annotated frame. Returns immediately; an unencoded older frame is replaced."""
+        with self._cond:
+            if self._subscribers == 0 or self._closed:
+                return
+            self.frames_published += 1
+            if self._pending is not None:
+                self.frames_superseded += 1
+            self._pending = frame_ref
+            self._cond.notify_all()
+
+    def _encode(self, frame, tier, resized):
+        width, quality = tier.key
+        image = frame
+        if width and width < frame.shape[1]:
+            # Tiers of the same width share one resize
+            image = resized.get(width)
+            if image is None:
+                height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+                image = resized[width] = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return mjpeg_part(encoded.tobytes()) if ok else None
+
+    def _encoder(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                frame_ref, self._pending = self._pending, None
+                tiers = [tier for tier in self._tiers.values() if tier.waiting]
+            if not tiers:
+                continue
+
+            frame = frame_ref.ring.acquire(frame_ref.seq)
+            if frame is None:
+                # Overwritten before it could be encoded; a newer frame is on its way
+                continue
+            parts = {}
+            try:
+                resized = {}
+                for tier in tiers:
+                    parts[tier.key] = self._encode(frame, tier, resized)
+            except Exception as e:
+                logger.warning(f"Stream encoding failed for {self.name}: {e}")
+            finally:
+                frame_ref.ring.release(frame_ref.seq)
+
+            with self._cond:
+                for tier in tiers:
+                    part = parts.get(tier.key)
+                    if part is None:
+                        continue
+                    tier.part = part
+                    tier.part_seq += 1
+                    tier.frames_encoded += 1
+                    tier.bytes_encoded += len(part)
+                for waiter in self._waiters:
+                    waiter.notify()
+
+    def _take(self, subscription):
+        """Returns the tier's part if it is newer than the viewer's last one. Call with the lock held."""
+        tier = subscription.tier
+        if tier.part is None or tier.part_seq <= subscription.last_seq:
+            return None
+        subscription.last_seq = tier.part_seq
+        subscription.frames_sent += 1
+        self.bytes_sent += len(tier.part)
+        now = time.monotonic()
+        self._sent.append((now, len(tier.part)))
+        while self._sent and now - self._sent[0][0] > BANDWIDTH_WINDOW:
+            self._sent.popleft()
+        return tier.part
+
+    async def wait_for_frame_async(self, subscription, timeout=1.0):
+        """Waits for a part newer than the last one this viewer got. Returns None on timeout or after close()."""
+        waiter = subscription.waiter
+        with self._cond:
+            part = self._take(subscription)
+            if part is not None or self._closed:
+                return part
+            # Cleared under the lock, so a part encoded after the check above still wakes us
+            waiter.event.clear()
+            subscription.tier.waiting += 1
+        try:
+            await asyncio.wait_for(waiter.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                subscription.tier.waiting -= 1
+        with self._cond:
+            return self._take(subscription)
+
+    @asynccontextmanager
+    async def subscribe_async(self, max_width=None, quality=None, max_fps=None):
+        """Registers an asyncio viewer for the duration of the block and yields its Subscription."""
+        key = tier_key(max_width, quality, self.jpeg_quality)
+        waiter = AsyncWaiter(asyncio.get_running_loop())
+        with self._cond:
+            tier = self._tiers.get(key)
+            if tier is None:
+                tier = self._tiers[key] = _Tier(key)
+            tier.subscribers += 1
+            self._subscribers += 1
+            self._waiters.add(waiter)
+        logger.info(f"Viewer attached to stream {self.name} at width {key[0] or 'full'}, quality {key[1]} ({self._subscribers} watching).")
+        try:
+            yield Subscription(tier, max_fps=max_fps, waiter=waiter)
+        finally:
+            with self._cond:
+                tier.subscribers -= 1
+                if tier.subscribers == 0:
+                    del self._tiers[key]
+                self._subscribers -= 1
+                if self._subscribers == 0:
+                    self._pending = None
+                self._waiters.discard(waiter)
+            logger.info(f"Viewer detached from stream {self.name} ({self._subscribers} watching).")
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify_all()
+            for waiter in self._waiters:
+                waiter.notify()
+        self._thread.join(timeout=2)
+
+    def get_stats(self):
+        with self._cond:
+            now = time.monotonic()
+            recent = sum(size for sent_at, size in self._sent if now - sent_at <= BANDWIDTH_WINDOW)
+            tiers = {
+                f"{width or 'full'}@q{quality}": {
+                    "subscribers": tier.subscribers,
+                    "frames_encoded": tier.frames_encoded,
+                    "avg_frame_kb": round(tier.bytes_encoded / tier.frames_encoded / 1024, 1) if tier.frames_encoded else None,
+                }
+                for (width, quality), tier in self._tiers.items()
+            }
+        return {
+            "subscribers": self._subscribers,
+            "frames_published": self.frames_published,
+            "frames_superseded": self.frames_superseded,
+            "bytes_sent": self.bytes_sent,
+            "bandwidth_kbps": round(recent * 8 / 1000 / BANDWIDTH_WINDOW, 1),
+            "tiers": tiers,
+        }